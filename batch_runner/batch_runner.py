@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import time
+import traceback
+from batch_runner.job_queue import JobQueue
+from db.cassandra_connection import session_manager
+from db.dao import KEYSPACE, verificar_existencia_y_limpiar
+from trackers import Tracker
+from track_cache import TrackCache
+from utils import get_video_properties
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
+
+def run_worker(process_func, queue_dir, model_path, cache_dir, streaming, tracker_options):
+    # Worker process: loads the YOLO model once and keeps pulling videos from
+    # the queue until it is empty
+    tracker = Tracker(model_path, **tracker_options)
+    cache = TrackCache(cache_dir) if cache_dir else None
+    queue = JobQueue(queue_dir)
+
+    # One Cassandra session for every video of this worker
+    session_manager.session(KEYSPACE)
+    try:
+        process_jobs(queue, process_func, tracker, cache, streaming)
+    finally:
+        session_manager.shutdown()
+
+def process_jobs(queue, process_func, tracker, cache, streaming):
+    while True:
+        job = queue.claim()
+        if job is None:
+            return
+
+        payload = job["payload"]
+        video_id = payload["video_id"]
+        start_time = time.time()
+        print(f"[worker {os.getpid()}] Video {video_id} (intento {job['attempts']})")
+        try:
+            # The DAO check makes every job idempotent: finished videos are
+            # skipped, partially saved ones are cleaned (or resumed from their
+            # checkpoint) before reprocessing
+            status = verificar_existencia_y_limpiar(video_id)
+            if status not in ["exists_in_jugadores", "exists_in_balon", "does_not_exist", "in_progress"]:
+                queue.complete(job, {"status": status, "frames": 0, "seconds": time.time() - start_time})
+                continue
+
+            # The output is only moved into place once the video is complete, so
+            # a crash never leaves a truncated output behind
+            output_path = payload["output_path"]
+            root, extension = os.path.splitext(output_path)
+            partial_output_path = f"{root}.partial{extension}"
+            process_func(payload["video_path"], partial_output_path, video_id,
+                         streaming=streaming, cache=cache, tracker=tracker)
+            os.replace(partial_output_path, output_path)
+
+            queue.complete(job, {"status": status,
+                                 "frames": get_video_properties(payload["video_path"])["frame_count"],
+                                 "seconds": time.time() - start_time})
+        except Exception as e:
+            traceback.print_exc()
+            queue.fail(job, f"{type(e).__name__}: {e}")
+
+class BatchRunner:
+    # Non-interactive processing of many videos with a pool of persistent
+    # worker processes pulling from a file-backed JobQueue. Each worker loads
+    # the model once for all of its videos. Workers that die are replaced and
+    # their job goes back to the queue; jobs interrupted by a crash of the
+    # whole batch are recovered on the next run.
+    def __init__(self, process_func, queue_dir='./jobs', num_workers=1,
+                 model_path='./models/best.pt', cache_dir='./cache', streaming=False, tracker_options=None):
+        self.process_func = process_func
+        self.queue = JobQueue(queue_dir)
+        self.num_workers = num_workers
+        self.model_path = model_path
+        self.cache_dir = cache_dir
+        self.streaming = streaming
+        # Detection stride, backend, ... forwarded to every worker's Tracker
+        self.tracker_options = tracker_options or {}
+
+    def enqueue_folder(self, input_folder, output_folder):
+        os.makedirs(output_folder, exist_ok=True)
+        enqueued = 0
+        for video_file in sorted(os.listdir(input_folder)):
+            if not video_file.endswith(VIDEO_EXTENSIONS):
+                print(f"El archivo {video_file} no es un video compatible, se omitirá.")
+                continue
+            # Usar el nombre del archivo como ID del video
+            video_id = os.path.splitext(video_file)[0]
+            payload = {
+                "video_id": video_id,
+                "video_path": os.path.join(input_folder, video_file),
+                "output_path": os.path.join(output_folder, f'output_{video_id}.mp4'),
+            }
+            enqueued += self.queue.put(video_id, payload)
+        return enqueued
+
+    def start_worker(self, context):
+        worker = context.Process(target=run_worker,
+                                 args=(self.process_func, self.queue.queue_dir, self.model_path,
+                                       self.cache_dir, self.streaming, self.tracker_options))
+        worker.start()
+        return worker
+
+    def run(self, poll_interval=1.0):
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"Recuperados {len(recovered)} trabajos interrumpidos: {', '.join(recovered)}")
+
+        start_time = time.time()
+        # spawn: CUDA cannot be used in forked children
+        context = multiprocessing.get_context("spawn")
+        workers = [self.start_worker(context) for _ in range(self.num_workers)]
+
+        while workers:
+            time.sleep(poll_interval)
+            for worker in [worker for worker in workers if not worker.is_alive()]:
+                workers.remove(worker)
+                if worker.exitcode != 0:
+                    print(f"El worker {worker.pid} terminó con código {worker.exitcode}.")
+                    self.queue.recover(pids=[worker.pid])
+                    if self.queue.job_ids("pending"):
+                        workers.append(self.start_worker(context))
+
+        return self.report(start_time, time.time())
+
+    def report(self, start_time, end_time):
+        # Aggregate throughput of the jobs finished during this run
+        results = []
+        for job_id in self.queue.job_ids("done"):
+            job = self.queue.read("done", job_id)
+            if job.get("finished_at", 0) >= start_time:
+                results.append(job["result"])
+
+        processed = [result for result in results if result.get("frames", 0) > 0]
+        elapsed = max(end_time - start_time, 1e-9)
+        frames = sum(result["frames"] for result in processed)
+        stats = {
+            "videos": len(processed),
+            "skipped": len(results) - len(processed),
+            "failed": len(self.queue.job_ids("failed")),
+            "frames": frames,
+            "seconds": elapsed,
+            "videos_per_hour": len(processed) / elapsed * 3600,
+            "frames_per_second": frames / elapsed,
+        }
+        print(f"Videos procesados: {stats['videos']} (omitidos: {stats['skipped']}, fallidos: {stats['failed']})")
+        print(f"Tiempo total: {elapsed:.1f} s con {self.num_workers} worker(s)")
+        print(f"Rendimiento: {stats['videos_per_hour']:.2f} videos/hora, {stats['frames_per_second']:.2f} frames/s")
+        return stats
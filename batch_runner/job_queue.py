@@ -0,0 +1,118 @@
+import json
+import os
+import time
+
+JOB_STATES = ["pending", "running", "done", "failed"]
+
+class JobQueue:
+    # Local job queue backed by one JSON file per job. A job's state is the
+    # directory it lives in (pending, running, done or failed) and every
+    # transition is an atomic os.replace, so several worker processes can pull
+    # from the same queue and a crash never leaves a job half-moved. Jobs
+    # still in "running" whose worker process is gone are put back in
+    # "pending" by recover().
+    def __init__(self, queue_dir='./jobs', max_attempts=3):
+        self.queue_dir = queue_dir
+        self.max_attempts = max_attempts
+        for state in JOB_STATES:
+            os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+
+    def path(self, state, job_id):
+        return os.path.join(self.queue_dir, state, f"{job_id}.json")
+
+    def read(self, state, job_id):
+        with open(self.path(state, job_id)) as f:
+            return json.load(f)
+
+    def write(self, state, job):
+        path = self.path(state, job["id"])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def job_ids(self, state):
+        return sorted(name[:-len(".json")] for name in os.listdir(os.path.join(self.queue_dir, state))
+                      if name.endswith(".json"))
+
+    def state_of(self, job_id):
+        for state in JOB_STATES:
+            if os.path.exists(self.path(state, job_id)):
+                return state
+        return None
+
+    def put(self, job_id, payload, retry_failed=True):
+        # Jobs are keyed by id, so enqueueing the same video twice is a no-op.
+        # Failed jobs get a fresh set of attempts.
+        state = self.state_of(job_id)
+        if state == "failed" and retry_failed:
+            job = self.read("failed", job_id)
+            job["attempts"] = 0
+            self.write("pending", job)
+            os.remove(self.path("failed", job_id))
+            return True
+        if state is not None:
+            return False
+        self.write("pending", {"id": job_id, "payload": payload, "attempts": 0, "enqueued_at": time.time()})
+        return True
+
+    def claim(self):
+        # Renaming pending -> running is atomic: if two workers race for the
+        # same job only one rename succeeds and the other tries the next job
+        for job_id in self.job_ids("pending"):
+            try:
+                os.replace(self.path("pending", job_id), self.path("running", job_id))
+            except FileNotFoundError:
+                continue
+            job = self.read("running", job_id)
+            job["attempts"] += 1
+            job["pid"] = os.getpid()
+            job["started_at"] = time.time()
+            self.write("running", job)
+            return job
+        return None
+
+    def complete(self, job, result=None):
+        job["result"] = result or {}
+        job["finished_at"] = time.time()
+        self.write("done", job)
+        os.remove(self.path("running", job["id"]))
+
+    def fail(self, job, error):
+        # Retried until max_attempts, then parked in "failed"
+        job["error"] = error
+        job["finished_at"] = time.time()
+        self.write("pending" if job["attempts"] < self.max_attempts else "failed", job)
+        os.remove(self.path("running", job["id"]))
+
+    def recover(self, pids=None):
+        # Jobs left in "running" by a worker that died (crash, kill, power
+        # loss) go back to "pending", counting the crashed run as an attempt.
+        # With pids only the jobs of those (dead) workers are recovered.
+        recovered = []
+        for job_id in self.job_ids("running"):
+            try:
+                job = self.read("running", job_id)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            if pids is not None and job.get("pid") not in pids:
+                continue
+            if pids is None and pid_alive(job.get("pid")):
+                continue
+            self.fail(job, "worker process exited while processing the job")
+            recovered.append(job_id)
+        return recovered
+
+    def counts(self):
+        return {state: len(self.job_ids(state)) for state in JOB_STATES}
+
+def pid_alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
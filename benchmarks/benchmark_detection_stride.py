@@ -0,0 +1,83 @@
+# Speed versus accuracy of the detection stride: tracks the same clip with
+# YOLO on every frame and with YOLO every k frames (motion-predicted boxes in
+# between, falling back to full rate when tracks become uncertain). Accuracy
+# is measured against the full-rate run: the share of its player boxes that
+# are matched with IoU >= 0.5, the mean IoU of the matches and the ball
+# center error in pixels.
+#
+#   python benchmarks/benchmark_detection_stride.py input_videos/clip.mp4 [--strides 2 3 4] [--frames 600]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils import read_video
+from trackers import Tracker
+from trackers.detection_stride import box_iou
+
+
+def run(model_path, frames, stride):
+    tracker = Tracker(model_path, detect_stride=stride)
+    start_time = time.perf_counter()
+    tracks = tracker.get_object_tracks(frames)
+    return tracks, time.perf_counter() - start_time, tracker
+
+
+def compare(reference, tracks):
+    matched = 0
+    total = 0
+    ious = []
+    ball_errors = []
+    for reference_players, players in zip(reference["players"], tracks["players"]):
+        total += len(reference_players)
+        if not reference_players or not players:
+            continue
+        reference_boxes = np.array([player["bbox"] for player in reference_players.values()])
+        boxes = np.array([player["bbox"] for player in players.values()])
+        pair_ious = box_iou(np.repeat(reference_boxes, len(boxes), axis=0),
+                            np.tile(boxes, (len(reference_boxes), 1))).reshape(len(reference_boxes), len(boxes))
+        rows, cols = linear_sum_assignment(-pair_ious)
+        good = pair_ious[rows, cols] >= 0.5
+        matched += good.sum()
+        ious.extend(pair_ious[rows, cols][good])
+
+    for reference_ball, ball in zip(reference["ball"], tracks["ball"]):
+        if 1 in reference_ball and 1 in ball:
+            reference_box = np.asarray(reference_ball[1]["bbox"])
+            box = np.asarray(ball[1]["bbox"])
+            ball_errors.append(np.linalg.norm((reference_box[:2]+reference_box[2:])/2 - (box[:2]+box[2:])/2))
+
+    return {
+        "recall": matched / max(total, 1),
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+        "ball_error": float(np.median(ball_errors)) if ball_errors else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('video')
+    parser.add_argument('--model', default='models/best.pt')
+    parser.add_argument('--strides', type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument('--frames', type=int, default=600)
+    args = parser.parse_args()
+
+    frames = read_video(args.video)[:args.frames]
+
+    reference, reference_time, tracker = run(args.model, frames, 1)
+    print(f"stride 1: {reference_time:.2f} s ({len(frames)/reference_time:.1f} frames/s), "
+          f"batch size settled at {tracker.scheduler.batch_size}")
+
+    for stride in args.strides:
+        tracks, elapsed, tracker = run(args.model, frames, stride)
+        metrics = compare(reference, tracks)
+        print(f"stride {stride}: {elapsed:.2f} s ({len(frames)/elapsed:.1f} frames/s, x{reference_time/elapsed:.2f}), "
+              f"YOLO on {tracker.detection_stride.detected_frames}/{len(frames)} frames, "
+              f"player recall@0.5 {metrics['recall']*100:.1f}%, mean IoU {metrics['mean_iou']:.3f}, "
+              f"ball center error {metrics['ball_error']:.1f} px")
+
+
+if __name__ == '__main__':
+    main()
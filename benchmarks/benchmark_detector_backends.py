@@ -0,0 +1,96 @@
+# Frames/s and detection parity of the detector backends. Every backend runs
+# on the same frames; its detections are matched per class against the
+# PyTorch ones (Hungarian matching on IoU >= 0.5) and reported as recall,
+# precision, mean IoU and mean confidence difference of the matches.
+#
+#   python benchmarks/benchmark_detector_backends.py input_videos/clip.mp4 [--backends onnx openvino] [--int8]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import supervision as sv
+from scipy.optimize import linear_sum_assignment
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils import read_video
+from trackers.detector_backends import load_detector
+from trackers.detection_stride import box_iou
+
+
+def detect(detector, frames, batch_size, conf):
+    detections = []
+    start_time = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        detections += detector.predict(frames[i:i+batch_size], conf)
+    elapsed = time.perf_counter() - start_time
+    return [sv.Detections.from_ultralytics(detection) for detection in detections], elapsed
+
+
+def compare(reference, detections):
+    matched = 0
+    reference_total = 0
+    total = 0
+    ious = []
+    confidence_differences = []
+    for reference_frame, frame in zip(reference, detections):
+        reference_total += len(reference_frame)
+        total += len(frame)
+        for class_id in np.unique(reference_frame.class_id):
+            reference_class = reference_frame[reference_frame.class_id == class_id]
+            frame_class = frame[frame.class_id == class_id]
+            if len(frame_class) == 0:
+                continue
+            pair_ious = box_iou(np.repeat(reference_class.xyxy, len(frame_class), axis=0),
+                                np.tile(frame_class.xyxy, (len(reference_class), 1)))
+            pair_ious = pair_ious.reshape(len(reference_class), len(frame_class))
+            rows, cols = linear_sum_assignment(-pair_ious)
+            good = pair_ious[rows, cols] >= 0.5
+            matched += good.sum()
+            ious.extend(pair_ious[rows, cols][good])
+            confidence_differences.extend(np.abs(reference_class.confidence[rows[good]] - frame_class.confidence[cols[good]]))
+
+    return {
+        "recall": matched / max(reference_total, 1),
+        "precision": matched / max(total, 1),
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+        "confidence_difference": float(np.mean(confidence_differences)) if confidence_differences else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('video')
+    parser.add_argument('--model', default='models/best.pt')
+    parser.add_argument('--backends', nargs='+', default=['onnx', 'openvino'])
+    parser.add_argument('--int8', action='store_true', help='also benchmark the INT8 OpenVINO model')
+    parser.add_argument('--int8-data', default=None)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--conf', type=float, default=0.1)
+    args = parser.parse_args()
+
+    frames = read_video(args.video)[:args.frames]
+
+    runs = [("pytorch", load_detector(args.model, "pytorch"))]
+    for backend in args.backends:
+        runs.append((backend, load_detector(args.model, backend)))
+    if args.int8:
+        runs.append(("openvino int8", load_detector(args.model, "openvino", int8=True, calibration_data=args.int8_data)))
+
+    reference = None
+    for name, detector in runs:
+        # Warm-up batch so model loading and graph compilation are not timed
+        detector.predict(frames[:args.batch_size], args.conf)
+        detections, elapsed = detect(detector, frames, args.batch_size, args.conf)
+        line = f"{name:>14}: {len(frames)/elapsed:6.1f} frames/s"
+        if reference is None:
+            reference = detections
+        else:
+            metrics = compare(reference, detections)
+            line += (f", recall {metrics['recall']*100:.1f}%, precision {metrics['precision']*100:.1f}%, "
+                     f"mean IoU {metrics['mean_iou']:.3f}, conf diff {metrics['confidence_difference']:.3f}")
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Per-frame cost of the HUD overlays (ball control and camera movement panels):
+# the previous full-frame copy + addWeighted versus HudRenderer, which blends
+# only the panel region in place and composes text from cached glyphs.
+#
+#   python benchmarks/benchmark_draw.py [--frames 300]
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils import HudRenderer
+
+
+def draw_legacy(frame, frame_num, team_1, team_2):
+    frame = frame.copy()
+
+    overlay = frame.copy()
+    cv2.rectangle(overlay, (1350, 850), (1900,970), (255,255,255), -1 )
+    cv2.addWeighted(overlay, 0.4, frame, 0.6, 0, frame)
+    cv2.putText(frame, f"Team 1 Ball Control: {team_1*100:.2f}%",(1400,900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+    cv2.putText(frame, f"Team 2 Ball Control: {team_2*100:.2f}%",(1400,950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+
+    overlay = frame.copy()
+    cv2.rectangle(overlay,(0,0),(500,100),(255,255,255),-1)
+    cv2.addWeighted(overlay,0.6,frame,0.4,0,frame)
+    cv2.putText(frame,f"Camera Movement X: {frame_num*0.01:.2f}",(10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+    cv2.putText(frame,f"Camera Movement Y: {-frame_num*0.02:.2f}",(10,60), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+    return frame
+
+
+def draw_renderer(hud, frame, frame_num, team_1, team_2):
+    hud.blend_rectangle(frame, (1350, 850), (1900,970), (255,255,255), 0.4)
+    hud.put_text(frame, f"Team 1 Ball Control: {team_1*100:.2f}%",(1400,900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+    hud.put_text(frame, f"Team 2 Ball Control: {team_2*100:.2f}%",(1400,950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+
+    hud.blend_rectangle(frame,(0,0),(500,100),(255,255,255),0.6)
+    hud.put_text(frame,f"Camera Movement X: {frame_num*0.01:.2f}",(10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+    hud.put_text(frame,f"Camera Movement Y: {-frame_num*0.02:.2f}",(10,60), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8) for _ in range(8)]
+    team_1 = rng.random(args.frames)
+
+    start_time = time.perf_counter()
+    for frame_num in range(args.frames):
+        legacy = draw_legacy(frames[frame_num % len(frames)], frame_num, team_1[frame_num], 1-team_1[frame_num])
+    legacy_time = (time.perf_counter() - start_time) / args.frames
+
+    hud = HudRenderer()
+    buffer = np.empty_like(frames[0])
+    start_time = time.perf_counter()
+    for frame_num in range(args.frames):
+        np.copyto(buffer, frames[frame_num % len(frames)])
+        rendered = draw_renderer(hud, buffer, frame_num, team_1[frame_num], 1-team_1[frame_num])
+    renderer_time = (time.perf_counter() - start_time) / args.frames
+
+    same_output = np.array_equal(legacy, rendered)
+    print(f"Legacy overlays:   {legacy_time*1000:.2f} ms/frame")
+    print(f"HudRenderer:       {renderer_time*1000:.2f} ms/frame (includes copying into the reusable buffer)")
+    print(f"Speed-up:          {legacy_time/renderer_time:.1f}x, identical output: {same_output}")
+
+
+if __name__ == '__main__':
+    main()
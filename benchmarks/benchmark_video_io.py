@@ -0,0 +1,109 @@
+# Frames/s of video decoding and encoding on their own: the plain
+# cv2.VideoCapture / cv2.VideoWriter loops versus the threaded VideoReader and
+# VideoWriter of utils.video_utils. --work adds that many milliseconds of
+# per-frame processing, which the threaded versions overlap with decoding or
+# encoding.
+#
+#   python benchmarks/benchmark_video_io.py input_videos/clip.mp4 [--frames 300] [--work 10] [--codecs mp4v XVID h264]
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import cv2
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.video_utils import VideoReader, VideoWriter
+
+
+def work(milliseconds):
+    if milliseconds:
+        time.sleep(milliseconds / 1000)
+
+
+def read_plain(video_path, max_frames, milliseconds):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    start_time = time.perf_counter()
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        work(milliseconds)
+        frames.append(frame)
+    elapsed = time.perf_counter() - start_time
+    cap.release()
+    return frames, elapsed
+
+
+def read_threaded(video_path, max_frames, milliseconds):
+    frames = 0
+    start_time = time.perf_counter()
+    for _ in VideoReader(video_path):
+        work(milliseconds)
+        frames += 1
+        if frames >= max_frames:
+            break
+    return frames, time.perf_counter() - start_time
+
+
+def write_plain(path, frames, fps, codec, milliseconds):
+    size = (frames[0].shape[1], frames[0].shape[0])
+    start_time = time.perf_counter()
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+    for frame in frames:
+        work(milliseconds)
+        writer.write(frame)
+    writer.release()
+    return time.perf_counter() - start_time
+
+
+def write_threaded(path, frames, fps, codec, milliseconds, preview_path=None):
+    size = (frames[0].shape[1], frames[0].shape[0])
+    start_time = time.perf_counter()
+    writer = VideoWriter(path, size, fps=fps, codec=codec, preview_path=preview_path)
+    for frame in frames:
+        work(milliseconds)
+        writer.write(frame)
+    writer.release()
+    return time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('video_path')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--work', type=float, default=0.0, help='simulated processing per frame (ms)')
+    parser.add_argument('--codecs', nargs='+', default=['mp4v', 'XVID', 'h264'])
+    args = parser.parse_args()
+
+    fps = cv2.VideoCapture(args.video_path).get(cv2.CAP_PROP_FPS) or 24
+    frames, plain_time = read_plain(args.video_path, args.frames, args.work)
+    threaded_frames, threaded_time = read_threaded(args.video_path, args.frames, args.work)
+    print(f"{'read':<24}{'frames/s':>10}")
+    print(f"{'cv2.VideoCapture':<24}{len(frames)/plain_time:>10.1f}")
+    print(f"{'VideoReader':<24}{threaded_frames/threaded_time:>10.1f}")
+
+    print(f"\n{'write':<24}{'frames/s':>10}{'MB':>8}")
+    output_dir = tempfile.mkdtemp()
+    try:
+        for codec in args.codecs:
+            if codec == 'h264' and not shutil.which('ffmpeg'):
+                print(f"{'h264':<24}{'skipped (no ffmpeg)':>26}")
+                continue
+            extension = '.avi' if codec == 'XVID' else '.mp4'
+            path = os.path.join(output_dir, f'{codec}{extension}')
+            if codec != 'h264':
+                elapsed = write_plain(path, frames, fps, codec, args.work)
+                print(f"{'cv2.VideoWriter ' + codec:<24}{len(frames)/elapsed:>10.1f}{os.path.getsize(path)/1e6:>8.1f}")
+            elapsed = write_threaded(path, frames, fps, codec, args.work)
+            print(f"{'VideoWriter ' + codec:<24}{len(frames)/elapsed:>10.1f}{os.path.getsize(path)/1e6:>8.1f}")
+            elapsed = write_threaded(path, frames, fps, codec, args.work,
+                                     preview_path=os.path.join(output_dir, f'{codec}_preview{extension}'))
+            print(f"{'  + 0.25 preview':<24}{len(frames)/elapsed:>10.1f}")
+    finally:
+        shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,72 @@ import cv2
 import numpy as np
 import os
 import sys 
+from concurrent.futures import ProcessPoolExecutor
 sys.path.append('../')
-from utils import measure_distance,measure_xy_distance
+from utils import measure_distance,measure_xy_distance,HudRenderer,get_video_properties
+
+
+def estimate_camera_movement_segment(estimator, video_path, anchor, end, stop=None):
+    # Runs the sequential estimator over frames [anchor, end) of the video
+    # (end=None reads to the last frame) as if features had just been
+    # detected on the anchor frame. Runs in a worker process for the chunked
+    # mode, so it only takes picklable arguments and decodes its own frames.
+    # stop (parent process only) is called with every frame on which features
+    # are detected again; returning True ends the segment after that frame.
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Unable to open video file: {video_path}")
+    if anchor > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, anchor)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != anchor:
+            # The seek snapped to another frame (keyframe-only seeking on some
+            # codecs): decode forward from the start instead
+            cap.release()
+            cap = cv2.VideoCapture(video_path)
+            for _ in range(anchor):
+                if not cap.grab():
+                    break
+
+    movements = []
+    resets = []
+    frame_num = anchor
+    while end is None or frame_num < end:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_num == anchor:
+            estimator.start_stream(frame)
+            movements.append([0,0])
+        else:
+            movements.append(estimator.update_stream(frame))
+        resets.append(estimator.features_reset)
+        if stop is not None and estimator.features_reset and stop(frame_num):
+            break
+        frame_num += 1
+    cap.release()
+
+    return movements, resets, estimator.camera_transforms
 
 class CameraMovementEstimator():
-    def __init__(self,frame):
+    # mode selects how the movement between two frames is measured:
+    #   'max_displacement': largest optical-flow displacement (original method)
+    #   'affine': RANSAC similarity transform (cv2.estimateAffinePartial2D)
+    #   'homography': RANSAC homography (cv2.findHomography)
+    # The RANSAC modes track features on a grayscale frame downscaled by
+    # `downscale` (halving the frame also halves the pixel motion the optical
+    # flow has to follow on fast pans) and keep the full 3x3 transform of every
+    # frame in self.camera_transforms.
+    def __init__(self,frame,mode='max_displacement',downscale=0.5):
         self.minimum_distance = 5
+        self.hud = HudRenderer()
+        self.mode = mode
+        self.downscale = downscale
+        self.ransac_threshold = 3.0
+        self.minimum_tracked_features = 20
+        self.camera_transforms = []
+        # True when the last start_stream/update_stream detected new features;
+        # from that frame on the estimator state no longer depends on history
+        self.features_reset = False
 
         self.lk_params = dict(
             winSize = (15,15),
@@ -29,6 +89,20 @@ class CameraMovementEstimator():
             mask = mask_features
         )
 
+        # Feature parameters for the (optionally downscaled) frames used by
+        # the RANSAC modes
+        self.frame_size = (first_frame_grayscale.shape[1],first_frame_grayscale.shape[0])
+        self.scaled_features = dict(self.features)
+        if self.mode != 'max_displacement' and self.downscale != 1.0:
+            self.scaled_features['mask'] = cv2.resize(mask_features,None,fx=self.downscale,fy=self.downscale,
+                                                      interpolation=cv2.INTER_NEAREST)
+
+    @staticmethod
+    def working_scale(mode='max_displacement',downscale=0.5):
+        # Scale of the grayscale frames the optical flow runs on, e.g. for a
+        # FrameStore proxy
+        return 1.0 if mode == 'max_displacement' else downscale
+
     def add_adjust_positions_to_tracks(self,tracks, camera_movement_per_frame):
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
@@ -40,46 +114,251 @@ class CameraMovementEstimator():
                     
 
 
-    def get_camera_movement(self,frames,read_from_stub=False, stub_path=None):
+    def add_adjust_positions_to_table(self,table, camera_movement_per_frame):
+        camera_movement = np.asarray(camera_movement_per_frame,dtype=np.float64).reshape(-1,2)
+        table.position_adjusted = table.position - camera_movement[table.frame]
+
+    def get_cache_key(self,cache,video_path):
+        return cache.make_key("camera_movement", cache.hash_file(video_path),
+                              self.minimum_distance, self.lk_params, self.features,
+                              self.mode, self.downscale, self.ransac_threshold, self.minimum_tracked_features)
+
+    def get_camera_movement(self,frames,read_from_stub=False, stub_path=None, cache=None, cache_key=None):
         # Read the stub 
         if read_from_stub and stub_path is not None and os.path.exists(stub_path):
             with open(stub_path,'rb') as f:
                 return pickle.load(f)
 
+        if cache is not None and cache_key is not None:
+            camera_movement = cache.get_camera_movement(cache_key)
+            if camera_movement is not None:
+                return camera_movement
+
         camera_movement = [[0,0]]*len(frames)
 
-        old_gray = cv2.cvtColor(frames[0],cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray,**self.features)
+        self.start_stream(frames[0])
 
         for frame_num in range(1,len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num],cv2.COLOR_BGR2GRAY)
-            new_features, _,_ = cv2.calcOpticalFlowPyrLK(old_gray,frame_gray,old_features,None,**self.lk_params)
-
-            max_distance = 0
-            camera_movement_x, camera_movement_y = 0,0
-
-            for i, (new,old) in enumerate(zip(new_features,old_features)):
-                new_features_point = new.ravel()
-                old_features_point = old.ravel()
-
-                distance = measure_distance(new_features_point,old_features_point)
-                if distance>max_distance:
-                    max_distance = distance
-                    camera_movement_x,camera_movement_y = measure_xy_distance(old_features_point, new_features_point ) 
-            
-            if max_distance > self.minimum_distance:
-                camera_movement[frame_num] = [camera_movement_x,camera_movement_y]
-                old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
-
-            old_gray = frame_gray.copy()
+            camera_movement[frame_num] = self.update_stream(frames[frame_num])
         
         if stub_path is not None:
             with open(stub_path,'wb') as f:
                 pickle.dump(camera_movement,f)
 
+        if cache is not None and cache_key is not None:
+            cache.put_camera_movement(cache_key, camera_movement)
+
+        return camera_movement
+
+    def get_camera_movement_chunked(self,video_path,num_workers=None,chunk_size=None,overlap=48,cache=None,cache_key=None):
+        # Splits the video into chunks that are estimated in a process pool.
+        # Each chunk starts `overlap` frames early. The estimator state only
+        # depends on the frames since the last feature detection, so once the
+        # previous (exact) result and a chunk both detect features on the same
+        # frame, the chunk's following output is exactly the sequential one.
+        # When a chunk never lines up, the video is read sequentially from the
+        # last feature detection of the exact result until it lines up with a
+        # later chunk. On footage with few feature detections (a static
+        # camera) that sequential read can run to the end, so the video is
+        # read at most once more than by the sequential method.
+        if cache is not None and cache_key is not None:
+            camera_movement = cache.get_camera_movement(cache_key)
+            if camera_movement is not None:
+                return camera_movement
+
+        num_frames = max(get_video_properties(video_path)["frame_count"],1)
+        num_workers = num_workers or os.cpu_count()
+        overlap = max(overlap,1)
+        chunk_size = chunk_size or max(-(-num_frames//num_workers),overlap+1)
+        chunk_starts = list(range(0,num_frames,chunk_size))
+        # The last chunk reads to the end in case the container frame count is off
+        chunk_ends = chunk_starts[1:]+[None]
+        chunk_anchors = [max(start-overlap,0) for start in chunk_starts]
+
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            futures = [pool.submit(estimate_camera_movement_segment,self,video_path,anchor,end)
+                       for anchor, end in zip(chunk_anchors,chunk_ends)]
+            results = [future.result() for future in futures]
+
+        camera_movement, resets, transforms = results[0]
+        chunk = 1
+        while chunk < len(results):
+            start, anchor = chunk_starts[chunk], chunk_anchors[chunk]
+            movements, chunk_resets, chunk_transforms = results[chunk]
+            # A shorter result (the container frame count was off or a read
+            # failed) never lines up
+            synced = len(camera_movement) >= start and any(
+                resets[frame_num] and chunk_resets[frame_num-anchor]
+                for frame_num in range(anchor,min(start,anchor+len(chunk_resets))))
+            if synced:
+                camera_movement = camera_movement+movements[start-anchor:]
+                resets = resets+chunk_resets[start-anchor:]
+                transforms = transforms+chunk_transforms[start-anchor:]
+                chunk += 1
+                continue
+
+            camera_movement, resets, transforms, chunk = self.resume_camera_movement(
+                video_path,camera_movement,resets,transforms,chunk_anchors,results,chunk)
+
+        if not camera_movement:
+            raise ValueError("No frames were read from the video. Please check the video file.")
+        self.camera_transforms = transforms
+
+        if cache is not None and cache_key is not None:
+            cache.put_camera_movement(cache_key, camera_movement)
+
         return camera_movement
+
+    def resume_camera_movement(self,video_path,camera_movement,resets,transforms,chunk_anchors,results,chunk):
+        # Reads sequentially from the last feature detection of the exact
+        # result and stops on the first frame where a chunk from `chunk` on
+        # detected features too; that chunk's output is spliced in after it.
+        # Returns the merged result and the next chunk to merge.
+        synced_chunk = None
+
+        def stop(frame_num):
+            nonlocal synced_chunk
+            for later in range(chunk,len(results)):
+                offset = frame_num-chunk_anchors[later]
+                if offset < 0:
+                    break
+                if offset < len(results[later][1]) and results[later][1][offset]:
+                    synced_chunk = later
+                    return True
+            return False
+
+        # The exact result is kept up to the anchor, whose movement was
+        # measured before the features were detected again; the first frame
+        # read starts the stream with [0,0]
+        if True in resets:
+            anchor = len(resets)-1-resets[::-1].index(True)
+            kept, skipped = anchor+1, 1
+        else:
+            anchor = kept = skipped = 0
+        movements, segment_resets, segment_transforms = estimate_camera_movement_segment(self,video_path,anchor,None,stop)
+        camera_movement = camera_movement[:kept]+movements[skipped:]
+        resets = resets[:kept]+segment_resets[skipped:]
+        transforms = transforms[:kept]+segment_transforms[skipped:]
+        if synced_chunk is None:
+            return camera_movement, resets, transforms, len(results)
+
+        offset = len(camera_movement)-chunk_anchors[synced_chunk]
+        movements, chunk_resets, chunk_transforms = results[synced_chunk]
+        return (camera_movement+movements[offset:], resets+chunk_resets[offset:],
+                transforms+chunk_transforms[offset:], synced_chunk+1)
+
+    def start_stream(self,frame):
+        # Incremental API used by the streaming pipeline: start_stream is called
+        # with the first frame, then update_stream with every following frame.
+        # Only the previous grayscale frame is kept between calls.
+        self.features_reset = True
+        if self.mode != 'max_displacement':
+            self.old_gray = self.get_scaled_gray(frame)
+            self.old_features = cv2.goodFeaturesToTrack(self.old_gray,**self.scaled_features)
+            self.camera_transforms = [np.eye(3)]
+            return
+
+        self.old_gray = self.get_gray(frame)
+        self.old_features = cv2.goodFeaturesToTrack(self.old_gray,**self.features)
+
+    def update_stream(self,frame):
+        if self.mode != 'max_displacement':
+            return self.update_stream_ransac(frame)
+
+        frame_gray = self.get_gray(frame)
+        new_features, _,_ = cv2.calcOpticalFlowPyrLK(self.old_gray,frame_gray,self.old_features,None,**self.lk_params)
+
+        max_distance = 0
+        camera_movement_x, camera_movement_y = 0,0
+
+        for i, (new,old) in enumerate(zip(new_features,self.old_features)):
+            new_features_point = new.ravel()
+            old_features_point = old.ravel()
+
+            distance = measure_distance(new_features_point,old_features_point)
+            if distance>max_distance:
+                max_distance = distance
+                camera_movement_x,camera_movement_y = measure_xy_distance(old_features_point, new_features_point ) 
+
+        movement = [0,0]
+        self.features_reset = max_distance > self.minimum_distance
+        if self.features_reset:
+            movement = [camera_movement_x,camera_movement_y]
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+
+        self.old_gray = frame_gray
+        return movement
+
+    def get_gray(self,frame):
+        # Frames of a FrameStore grayscale proxy are already grayscale
+        if frame.ndim == 2:
+            return frame
+        return cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+
+    def get_scaled_gray(self,frame):
+        frame_gray = self.get_gray(frame)
+        if self.downscale == 1.0 or frame_gray.shape[:2] == self.scaled_features['mask'].shape:
+            # Already at the working scale (a FrameStore proxy)
+            return frame_gray
+        if frame_gray.shape[1] != self.frame_size[0]:
+            raise ValueError(f"Frame of width {frame_gray.shape[1]} is neither the full frame ({self.frame_size[0]}) "
+                             f"nor the proxy at scale {self.downscale}")
+        return cv2.resize(frame_gray,None,fx=self.downscale,fy=self.downscale,interpolation=cv2.INTER_AREA)
+
+    def estimate_transform(self,old_points,new_points):
+        # Global motion between the two point sets as a 3x3 matrix in the
+        # coordinates of the scaled frames, or None if RANSAC fails
+        if self.mode == 'homography':
+            if len(old_points) < 4:
+                return None, None
+            transform, inliers = cv2.findHomography(old_points,new_points,cv2.RANSAC,self.ransac_threshold)
+            return transform, inliers
+
+        transform, inliers = cv2.estimateAffinePartial2D(old_points,new_points,method=cv2.RANSAC,
+                                                         ransacReprojThreshold=self.ransac_threshold)
+        if transform is None:
+            return None, None
+        return np.vstack([transform,[0,0,1]]), inliers
+
+    def update_stream_ransac(self,frame):
+        frame_gray = self.get_scaled_gray(frame)
+        transform = np.eye(3)
+        movement = [0,0]
+
+        tracked_features = None
+        if self.old_features is not None and len(self.old_features) >= 3:
+            new_features, status, _ = cv2.calcOpticalFlowPyrLK(self.old_gray,frame_gray,self.old_features,None,**self.lk_params)
+            tracked = status.ravel() == 1
+            old_points = self.old_features[tracked].reshape(-1,2)
+            new_points = new_features[tracked].reshape(-1,2)
+
+            if len(old_points) >= 3:
+                scaled_transform, inliers = self.estimate_transform(old_points,new_points)
+                if scaled_transform is not None:
+                    # Back to full-resolution pixel coordinates
+                    scale = np.diag([self.downscale,self.downscale,1.0])
+                    transform = np.linalg.inv(scale) @ scaled_transform @ scale
+
+                    # Same sign convention as the original method (old - new),
+                    # measured at the center of the frame
+                    center = np.array([self.frame_size[0]/2,self.frame_size[1]/2,1.0])
+                    moved_center = transform @ center
+                    moved_center = moved_center[:2]/moved_center[2]
+                    movement = (center[:2]-moved_center).tolist()
+
+                    # Keep following the inliers instead of re-detecting every frame
+                    tracked_features = new_points[inliers.ravel() == 1].reshape(-1,1,2)
+
+        self.features_reset = tracked_features is None or len(tracked_features) < self.minimum_tracked_features
+        if self.features_reset:
+            tracked_features = cv2.goodFeaturesToTrack(frame_gray,**self.scaled_features)
+
+        self.old_features = tracked_features
+        self.old_gray = frame_gray
+        self.camera_transforms.append(transform)
+        return movement
     
-    def draw_camera_movement(self,frames, camera_movement_per_frame):
+    def draw_camera_movement(self,frames, camera_movement_per_frame, in_place=False):
         output_frames = []
 
         # Validar que las longitudes coincidan
@@ -89,16 +368,15 @@ class CameraMovementEstimator():
                 camera_movement_per_frame.append((0, 0))
 
         for frame_num, frame in enumerate(frames):
-            frame= frame.copy()
+            if not in_place:
+                frame= frame.copy()
 
-            overlay = frame.copy()
-            cv2.rectangle(overlay,(0,0),(500,100),(255,255,255),-1)
             alpha =0.6
-            cv2.addWeighted(overlay,alpha,frame,1-alpha,0,frame)
+            self.hud.blend_rectangle(frame,(0,0),(500,100),(255,255,255),alpha)
 
             x_movement, y_movement = camera_movement_per_frame[frame_num]
-            frame = cv2.putText(frame,f"Camera Movement X: {x_movement:.2f}",(10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
-            frame = cv2.putText(frame,f"Camera Movement Y: {y_movement:.2f}",(10,60), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+            frame = self.hud.put_text(frame,f"Camera Movement X: {x_movement:.2f}",(10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+            frame = self.hud.put_text(frame,f"Camera Movement Y: {y_movement:.2f}",(10,60), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
 
             output_frames.append(frame) 
 
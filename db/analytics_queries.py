@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from db.cassandra_connection import CassandraConnection
+from db.dao import KEYSPACE, leer_progreso
+
+QUERY_SERIES_JUGADORES = """
+SELECT id_jugador, numero_cuadro, velocidad, distancia_recorrida FROM jugadores WHERE id_video = ?
+"""
+
+QUERY_POSICIONES_JUGADORES = """
+SELECT equipo, posicion_x, posicion_y FROM jugadores WHERE id_video = ?
+"""
+
+QUERY_POSESION_VIDEO = """
+SELECT numero_cuadro, equipo_en_control, posesion_equipo_1, posesion_equipo_2,
+       posesion_ventana_equipo_1, posesion_ventana_equipo_2 FROM posesion WHERE id_video = ?
+"""
+
+class AnalyticsQueries:
+    # Read side of the DAO. Every query reads one video partition page by
+    # page (page_size rows per request, resumed with the driver's paging
+    # state); with prefetch the next page is requested before the current one
+    # is decoded. Decoded results (numpy arrays) are kept in an LRU cache of
+    # cache_size entries keyed by (video_id, query, params). Only videos whose
+    # manifest says they are complete are cached, so a video still being
+    # written is always read again.
+    def __init__(self, keyspace=KEYSPACE, page_size=5000, prefetch=True, cache_size=128):
+        self.cassandra = CassandraConnection(keyspace)
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bind(self, query, values):
+        if self.cassandra.session is None:
+            self.cassandra.connect()
+        statement = self.cassandra.prepare(query).bind(values)
+        statement.fetch_size = self.page_size
+        return statement
+
+    def page(self, query, values, paging_state=None):
+        # One page of rows and the paging state of the next one (None at the
+        # end), for callers that paginate themselves
+        statement = self.bind(query, values)
+        result = self.cassandra.session.execute(statement, paging_state=paging_state)
+        return list(result.current_rows), result.paging_state if result.has_more_pages else None
+
+    def rows(self, query, values):
+        # Every row of the query, one page at a time
+        statement = self.bind(query, values)
+        session = self.cassandra.session
+        result = session.execute_async(statement).result()
+        while True:
+            next_page = None
+            if result.has_more_pages and self.prefetch:
+                next_page = session.execute_async(statement, paging_state=result.paging_state)
+            yield from result.current_rows
+            if not result.has_more_pages:
+                return
+            if next_page is None:
+                next_page = session.execute_async(statement, paging_state=result.paging_state)
+            result = next_page.result()
+
+    def cached(self, video_id, query, params, load):
+        key = (video_id, query, params)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+
+        value = load()
+        if self.cache_size and self.is_complete(video_id):
+            with self.lock:
+                self.cache[key] = value
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return value
+
+    def is_complete(self, video_id):
+        progreso = leer_progreso(self.cassandra, video_id)
+        return progreso is not None and bool(progreso.completo)
+
+    def invalidate(self, video_id=None):
+        with self.lock:
+            for key in [key for key in self.cache if video_id is None or key[0] == video_id]:
+                del self.cache[key]
+
+    def player_series(self, video_id, player_id=None):
+        # player_id -> {'frames', 'speed', 'distance'} arrays sorted by frame
+        # (only that player's series when player_id is given)
+        series = self.cached(video_id, "player_series", (), lambda: self.load_player_series(video_id))
+        if player_id is not None:
+            return series.get(player_id)
+        return series
+
+    def load_player_series(self, video_id):
+        columns = {}
+        for row in self.rows(QUERY_SERIES_JUGADORES, (video_id,)):
+            player = columns.setdefault(row.id_jugador, ([], [], []))
+            player[0].append(row.numero_cuadro)
+            player[1].append(np.nan if row.velocidad is None else row.velocidad)
+            player[2].append(np.nan if row.distancia_recorrida is None else row.distancia_recorrida)
+
+        series = {}
+        for player_id, (frames, speed, distance) in columns.items():
+            frames = np.array(frames, dtype=np.int64)
+            order = np.argsort(frames, kind="stable")
+            series[player_id] = {
+                "frames": frames[order],
+                "speed": np.array(speed, dtype=float)[order],
+                "distance": np.array(distance, dtype=float)[order],
+            }
+        return series
+
+    def possession_timeline(self, video_id):
+        # Arrays per column sorted by frame: 'frames', 'team_ball_control'
+        # and the cumulative and windowed possession of each team
+        return self.cached(video_id, "possession_timeline", (), lambda: self.load_possession_timeline(video_id))
+
+    def load_possession_timeline(self, video_id):
+        rows = sorted(self.rows(QUERY_POSESION_VIDEO, (video_id,)), key=lambda row: row.numero_cuadro)
+        return {
+            "frames": np.array([row.numero_cuadro for row in rows], dtype=np.int64),
+            "team_ball_control": np.array([row.equipo_en_control for row in rows], dtype=object),
+            "team_1": np.array([row.posesion_equipo_1 for row in rows], dtype=float),
+            "team_2": np.array([row.posesion_equipo_2 for row in rows], dtype=float),
+            "team_1_window": np.array([row.posesion_ventana_equipo_1 for row in rows], dtype=float),
+            "team_2_window": np.array([row.posesion_ventana_equipo_2 for row in rows], dtype=float),
+        }
+
+    def heatmap(self, video_id, team=None, bins=(12, 24), field=(23.32, 68)):
+        # Player-frame counts on a bins grid over the transformed court
+        # (field: its size in meters, see ViewTransformer). team: only that
+        # team's players.
+        team = None if team is None else str(team)
+        params = (team, tuple(bins), tuple(field))
+        return self.cached(video_id, "heatmap", params, lambda: self.load_heatmap(video_id, team, bins, field))
+
+    def load_heatmap(self, video_id, team, bins, field):
+        xs, ys = [], []
+        for row in self.rows(QUERY_POSICIONES_JUGADORES, (video_id,)):
+            if row.posicion_x is None or row.posicion_y is None:
+                continue
+            if team is not None and row.equipo != team:
+                continue
+            xs.append(row.posicion_x)
+            ys.append(row.posicion_y)
+        grid, _, _ = np.histogram2d(xs, ys, bins=bins, range=[[0, field[0]], [0, field[1]]])
+        return grid
@@ -1,22 +1,108 @@
-from cassandra.cluster import Cluster
+import atexit
+import os
+import threading
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+from cassandra.policies import DCAwareRoundRobinPolicy, TokenAwarePolicy
 from cassandra.query import BatchStatement, SimpleStatement
+from db.cassandra_writer import CassandraWriter
+
+class CassandraSessionManager:
+    # One Cluster per process, started on first use and shut down at exit.
+    # The driver keeps a pool of connections per host behind every Session,
+    # so a single Session per keyspace is shared by all the DAO calls (and
+    # threads) of the process instead of discovering the cluster again for
+    # every video. Token-aware routing sends each single-partition batch
+    # straight to a replica. Prepared statements are cached per keyspace.
+    def __init__(self, contact_points=('127.0.0.1',), request_timeout=30, **cluster_options):
+        self.contact_points = list(contact_points)
+        self.request_timeout = request_timeout
+        self.cluster_options = cluster_options
+        self.lock = threading.Lock()
+        self.cluster = None
+        self.sessions = {}
+        self.prepared = {}
+        self.schemas = set()
+        self.pid = None
+        self.shutdown_registered = False
+
+    def session(self, keyspace):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Driver connections cannot be shared with a forked child
+                self.cluster = None
+                self.sessions = {}
+                self.prepared = {}
+                self.schemas = set()
+                self.pid = os.getpid()
+
+            if self.cluster is None:
+                profile = ExecutionProfile(
+                    load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy()),
+                    request_timeout=self.request_timeout)
+                self.cluster = Cluster(self.contact_points, execution_profiles={EXEC_PROFILE_DEFAULT: profile},
+                                       **self.cluster_options)
+                if not self.shutdown_registered:
+                    atexit.register(self.shutdown)
+                    self.shutdown_registered = True
+
+            if keyspace not in self.sessions:
+                self.sessions[keyspace] = self.cluster.connect(keyspace)
+                self.prepared[keyspace] = {}
+                print(f"Conexión exitosa al keyspace: {keyspace}")
+            return self.sessions[keyspace]
+
+    def prepared_statements(self, keyspace):
+        self.session(keyspace)
+        return self.prepared[keyspace]
+
+    def ensure_schema(self, keyspace, create):
+        # Runs create() (the CREATE TABLE statements) once per keyspace and
+        # process instead of on every DAO call: DDL waits for schema
+        # agreement across the cluster
+        self.session(keyspace)
+        with self.lock:
+            if keyspace not in self.schemas:
+                create()
+                self.schemas.add(keyspace)
+
+    def shutdown(self):
+        with self.lock:
+            if self.cluster is not None and self.pid == os.getpid():
+                self.cluster.shutdown()
+                print("Conexión a Cassandra cerrada")
+            self.cluster = None
+            self.sessions = {}
+            self.prepared = {}
+            self.schemas = set()
+
+session_manager = CassandraSessionManager()
 
 class CassandraConnection:
-    def __init__(self, keyspace):
+    # Handle on the process-wide session of a keyspace. connect() and close()
+    # are cheap: the session is opened once by the manager and closed at exit
+    # (or by session_manager.shutdown()).
+    def __init__(self, keyspace, manager=None):
         self.keyspace = keyspace
+        self.manager = manager or session_manager
         self.cluster = None
         self.session = None
+        self.prepared = {}
 
     def connect(self):
-        self.cluster = Cluster(['127.0.0.1'])
-        self.session = self.cluster.connect()
-        self.session.set_keyspace(self.keyspace)
-        print(f"Conexión exitosa al keyspace: {self.keyspace}")
+        self.session = self.manager.session(self.keyspace)
+        self.cluster = self.manager.cluster
+        self.prepared = self.manager.prepared_statements(self.keyspace)
+
+    def prepare(self, query):
+        # Prepared once per query and reused for every execution
+        if query not in self.prepared:
+            self.prepared[query] = self.session.prepare(query)
+        return self.prepared[query]
 
     def execute_query(self, query, values=None):
         try:
             if values:
-                prepared = self.session.prepare(query)
+                prepared = self.prepare(query)
                 return self.session.execute(prepared, values)
             else:
                 return self.session.execute(query)
@@ -26,13 +112,20 @@ class CassandraConnection:
 
     def execute_batch(self, query_template, batch):
         batch_statement = BatchStatement()
-        prepared_statement = self.session.prepare(query_template)
+        prepared_statement = self.prepare(query_template)
 
         for values in batch:
             batch_statement.add(prepared_statement, values)
 
         self.session.execute(batch_statement)
 
+    def writer(self, **options):
+        writer = CassandraWriter(self.session, **options)
+        # Statements already prepared on this connection are reused
+        writer.prepared = self.prepared
+        return writer
+
     def close(self):
-        self.cluster.shutdown()
-        print("Conexión a Cassandra cerrada")
\ No newline at end of file
+        # The shared session stays open for the next caller
+        self.session = None
+        self.cluster = None
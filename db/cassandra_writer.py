@@ -0,0 +1,129 @@
+import threading
+from cassandra import OperationTimedOut, Unavailable, WriteTimeout
+from cassandra.query import BatchStatement, BatchType
+
+class CassandraWriter:
+    # Concurrent writer on top of session.execute_async. Statements are
+    # prepared once per query. Rows that share a partition key are sent as
+    # UNLOGGED batches of up to batch_size rows (a single-partition batch is
+    # applied by one replica as one mutation, without the batch log).
+    # At most `concurrency` requests are in flight: write() blocks until one
+    # finishes, which keeps memory bounded however fast rows are produced.
+    # Timeouts and unavailable errors are retried with exponential backoff;
+    # any other error is raised by the next write() or flush().
+    # The session only needs prepare() and execute_async() returning a
+    # future with add_callbacks(), so a mock session can be used in tests.
+    RETRYABLE_ERRORS = (OperationTimedOut, WriteTimeout, Unavailable)
+
+    def __init__(self, session, concurrency=32, batch_size=100, max_retries=3, retry_delay=0.5):
+        self.session = session
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.prepared = {}
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.errors = []
+        self.rows_written = 0
+        self.retries = 0
+
+    def prepare(self, query):
+        if query not in self.prepared:
+            self.prepared[query] = self.session.prepare(query)
+        return self.prepared[query]
+
+    def write(self, query, rows, partition_key=None):
+        # rows: iterable of value tuples. partition_key: indices of the
+        # partition key columns in each tuple; without it every row is sent
+        # as its own statement.
+        prepared = self.prepare(query)
+        if partition_key is None:
+            for values in rows:
+                self.submit(prepared, values, 1)
+            return
+
+        groups = {}
+        for values in rows:
+            key = tuple(values[i] for i in partition_key)
+            group = groups.setdefault(key, [])
+            group.append(values)
+            if len(group) >= self.batch_size:
+                self.submit_batch(prepared, groups.pop(key))
+        for group in groups.values():
+            self.submit_batch(prepared, group)
+
+    def submit_batch(self, prepared, rows):
+        if len(rows) == 1:
+            return self.submit(prepared, rows[0], 1)
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        for values in rows:
+            batch.add(prepared, values)
+        self.submit(batch, None, len(rows))
+
+    def submit(self, statement, values, rows):
+        self.raise_errors()
+        # Backpressure: wait for a free slot
+        self.slots.acquire()
+        with self.condition:
+            self.in_flight += 1
+        self.execute(statement, values, rows, 0)
+
+    def execute(self, statement, values, rows, attempt):
+        try:
+            future = self.session.execute_async(statement, values)
+        except Exception as e:
+            return self.on_error(e, statement, values, rows, attempt)
+        future.add_callbacks(callback=self.on_success, callback_args=(rows,),
+                             errback=self.on_error, errback_args=(statement, values, rows, attempt))
+
+    def on_success(self, _, rows):
+        with self.condition:
+            self.rows_written += rows
+        self.release()
+
+    def on_error(self, error, statement, values, rows, attempt):
+        if isinstance(error, self.RETRYABLE_ERRORS) and attempt < self.max_retries:
+            # Runs on the driver's event loop: schedule the retry instead of
+            # sleeping here
+            with self.condition:
+                self.retries += 1
+            timer = threading.Timer(self.retry_delay * 2**attempt, self.execute,
+                                    args=(statement, values, rows, attempt + 1))
+            timer.daemon = True
+            timer.start()
+            return
+        with self.condition:
+            self.errors.append(error)
+        self.release()
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+        self.slots.release()
+
+    def raise_errors(self):
+        with self.condition:
+            if self.errors:
+                error = self.errors[0]
+                self.errors = []
+                raise error
+
+    def flush(self):
+        # Waits for every request in flight, then raises the first error
+        with self.condition:
+            while self.in_flight:
+                self.condition.wait()
+        self.raise_errors()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            with self.condition:
+                while self.in_flight:
+                    self.condition.wait()
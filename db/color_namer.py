@@ -0,0 +1,55 @@
+import numpy as np
+import webcolors
+
+class ColorNamer:
+    # Closest CSS3 color name for an RGB color. The palette is parsed once
+    # into an array, nearest-neighbour search is a single vectorized distance
+    # computation on the float color, and results are memoized by color.
+    # step=1 keys on the color itself, so names are the ones the per-name loop
+    # gave; step > 1 snaps each channel to the centre of its `step`-wide bin
+    # first, trading exactness for hits.
+    def __init__(self, step=1):
+        self.step = step
+        if hasattr(webcolors, "names"):
+            names = webcolors.names("css3")
+        else:
+            names = list(webcolors.CSS3_NAMES_TO_HEX)
+
+        # One entry per distinct color. Colors with several names (aqua/cyan)
+        # keep the first one for nearest matches and the one
+        # webcolors.rgb_to_name gives for exact matches
+        palette = {}
+        for name in names:
+            palette.setdefault(tuple(webcolors.name_to_rgb(name)), name)
+        self.palette = np.array(list(palette), dtype=np.int64)
+        self.palette_names = list(palette.values())
+        self.exact_names = [webcolors.rgb_to_name(rgb) for rgb in palette]
+        self.cache = {}
+
+    def quantize(self, rgbs):
+        rgbs = np.asarray(rgbs, dtype=float).reshape(-1, 3)
+        if self.step > 1:
+            rgbs = np.floor(rgbs / self.step) * self.step + self.step / 2
+        return rgbs
+
+    def names(self, rgbs):
+        # Names for an (N, 3) array of colors
+        rgbs = self.quantize(rgbs)
+        keys = [tuple(rgb) for rgb in rgbs.tolist()]
+        missing = [i for i, key in enumerate(keys) if key not in self.cache]
+        if missing:
+            # Exact matches are looked up on the integer color, as
+            # webcolors.rgb_to_name(tuple(map(int, rgb))) did; the nearest
+            # name is searched on the float color
+            colors = rgbs[missing]
+            exact = (np.trunc(colors)[:, None, :] == self.palette[None, :, :]).all(axis=2)
+            distances = ((colors[:, None, :] - self.palette[None, :, :])**2).sum(axis=2)
+            nearest = distances.argmin(axis=1)
+            for i, row, index in zip(missing, exact, nearest.tolist()):
+                self.cache[keys[i]] = self.exact_names[row.argmax()] if row.any() else self.palette_names[index]
+        return [self.cache[key] for key in keys]
+
+    def name(self, rgb):
+        return self.names([rgb])[0]
+
+color_namer = ColorNamer()
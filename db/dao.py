@@ -1,152 +1,240 @@
 import uuid
 from db.cassandra_connection import CassandraConnection
-import webcolors
+from db.color_namer import color_namer
 
-def rgb_to_name(rgb):
-    try:
-        return webcolors.rgb_to_name(tuple(map(int, rgb)))
-    except ValueError:
-        min_diff = float('inf')
-        closest_color = None
-        for name, value in webcolors.CSS3_NAMES_TO_HEX.items():
-            r, g, b = webcolors.hex_to_rgb(value)
-            diff = sum((c1 - c2) ** 2 for c1, c2 in zip(rgb, (r, g, b)))
-            if diff < min_diff:
-                min_diff = diff
-                closest_color = name
-        return closest_color
-
-
-def guardar_datos(tracks, team_ball_control, video_id, keyspace="analitica_deportes"):
-    cassandra = CassandraConnection(keyspace)
-    cassandra.connect()
+KEYSPACE = "analitica_deportes"
 
-    query_jugadores_template = """
-    INSERT INTO jugadores (id_jugador, id_video, numero_cuadro, equipo, color_equipo, posicion_x, posicion_y, velocidad, distancia_recorrida, tiene_balon)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
-    batch_size = 500
-    batch = []
-
-    for frame_num, players in enumerate(tracks['players']):
-        for player_id, player_data in players.items():
-            # Obtener posición
-            posicion_x = float(player_data['position_transformed'][0]) if player_data['position_transformed'] else None
-            posicion_y = float(player_data['position_transformed'][1]) if player_data['position_transformed'] else None
-
-            # Determinar color del equipo
-            team = str(player_data.get('team', '0'))
-            team_color_vector = player_data.get('team_color', [])
-            color_equipo = "N/A"
-
-            try:
-                if isinstance(team_color_vector, list) and len(team_color_vector) > int(team) - 1:
-                    color_equipo = rgb_to_name(team_color_vector[int(team) - 1])
-            except (ValueError, IndexError):
-                color_equipo = "N/A"
-
-            # Agregar consulta al lote
-            batch.append((
-                player_id,
-                video_id,
-                frame_num,
-                team,
-                color_equipo,
-                posicion_x,
-                posicion_y,
-                player_data.get('speed', 0.0),
-                player_data.get('distance', 0.0),
-                player_data.get('has_ball', False)
-            ))
-
-            # Ejecutar el lote si alcanza el tamaño definido
-            if len(batch) >= batch_size:
-                cassandra.execute_batch(query_jugadores_template, batch)
-                batch = []
-
-    # Ejecutar cualquier resto del lote
-    if batch:
-        cassandra.execute_batch(query_jugadores_template, batch)
-
-    # Insertar datos del balón
-    query_balon = """
-    INSERT INTO balon (id_balon, id_video, numero_cuadro, posicion_x, posicion_y, id_jugador_asignado, equipo_en_control)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    """
-
-    # Tamaño del batch
-    batch_size = 500
-    batch = []
-
-    for frame_num, ball in enumerate(tracks['ball']):
-        ball_bbox = ball.get(1, {}).get('bbox', [])
-        assigned_player = ball.get(1, {}).get('assigned_player', None)
-        equipo_en_control = team_ball_control[frame_num] if frame_num < len(team_ball_control) else None
-
-        posicion_x = float(ball_bbox[0]) if ball_bbox else None
-        posicion_y = float(ball_bbox[1]) if ball_bbox else None
-        assigned_player = int(assigned_player) if assigned_player is not None else None
-        equipo_en_control = str(equipo_en_control) if equipo_en_control is not None else None
-
-        # Agregar datos al lote
-        batch.append((
-            uuid.uuid4(),
+def rgb_to_name(rgb):
+    return color_namer.name(rgb)
+
+def nombre_color_equipo(player_data, colores_equipo):
+    # Un equipo tiene un solo color por video: se nombra una vez por equipo
+    team = player_data.get('team', 0)
+    if team not in colores_equipo:
+        team_color = player_data.get('team_color')
+        colores_equipo[team] = rgb_to_name(team_color) if team and team_color is not None and len(team_color) == 3 else "N/A"
+    return colores_equipo[team]
+
+
+QUERY_JUGADORES = """
+INSERT INTO jugadores (id_jugador, id_video, numero_cuadro, equipo, color_equipo, posicion_x, posicion_y, velocidad, distancia_recorrida, tiene_balon)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+QUERY_BALON = """
+INSERT INTO balon (id_balon, id_video, numero_cuadro, posicion_x, posicion_y, id_jugador_asignado, equipo_en_control)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+QUERY_POSESION = """
+INSERT INTO posesion (id_video, numero_cuadro, equipo_en_control, posesion_equipo_1, posesion_equipo_2, posesion_ventana_equipo_1, posesion_ventana_equipo_2)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+def crear_tablas(cassandra):
+    # El esquema se crea una sola vez por keyspace y proceso
+    cassandra.manager.ensure_schema(cassandra.keyspace, lambda: ejecutar_crear_tablas(cassandra))
+
+def ejecutar_crear_tablas(cassandra):
+    cassandra.execute_query("""
+    CREATE TABLE IF NOT EXISTS posesion (
+        id_video text,
+        numero_cuadro int,
+        equipo_en_control text,
+        posesion_equipo_1 double,
+        posesion_equipo_2 double,
+        posesion_ventana_equipo_1 double,
+        posesion_ventana_equipo_2 double,
+        PRIMARY KEY (id_video, numero_cuadro)
+    )
+    """)
+
+    # Manifiesto de cada video: tablas con datos, último cuadro guardado por
+    # completo (ver FrameStreamWriter) y si el video terminó. Una sola fila
+    # por video, así que comprobar su estado es una lectura de una fila.
+    cassandra.execute_query("""
+    CREATE TABLE IF NOT EXISTS progreso_video (
+        id_video text PRIMARY KEY,
+        tablas set<text>,
+        ultimo_cuadro int,
+        cuadros int,
+        completo boolean,
+        actualizado timestamp
+    )
+    """)
+
+def filas_jugadores_cuadro(video_id, frame_num, players, colores_equipo):
+    # colores_equipo: dict equipo -> nombre del color, compartido por todo el video
+    for player_id, player_data in players.items():
+        # Obtener posición
+        posicion_x = float(player_data['position_transformed'][0]) if player_data['position_transformed'] else None
+        posicion_y = float(player_data['position_transformed'][1]) if player_data['position_transformed'] else None
+
+        yield (
+            player_id,
             video_id,
             frame_num,
+            str(player_data.get('team', '0')),
+            nombre_color_equipo(player_data, colores_equipo),
             posicion_x,
             posicion_y,
-            assigned_player,
-            equipo_en_control
-        ))
+            player_data.get('speed', 0.0),
+            player_data.get('distance', 0.0),
+            player_data.get('has_ball', False)
+        )
+
+def fila_balon_cuadro(video_id, frame_num, ball, equipo_en_control):
+    ball_bbox = ball.get(1, {}).get('bbox', [])
+    assigned_player = ball.get(1, {}).get('assigned_player', None)
+
+    posicion_x = float(ball_bbox[0]) if ball_bbox else None
+    posicion_y = float(ball_bbox[1]) if ball_bbox else None
+    assigned_player = int(assigned_player) if assigned_player is not None else None
+    equipo_en_control = str(equipo_en_control) if equipo_en_control is not None else None
+
+    # ID determinista por video y cuadro: volver a escribir un cuadro lo
+    # sobrescribe en lugar de duplicarlo
+    return (
+        uuid.uuid5(uuid.NAMESPACE_URL, f"{video_id}/{frame_num}"),
+        video_id,
+        frame_num,
+        posicion_x,
+        posicion_y,
+        assigned_player,
+        equipo_en_control
+    )
+
+def filas_posesion(video_id, columns, frames):
+    for frame_num in frames:
+        yield (video_id, frame_num, str(columns["team_ball_control"][frame_num]),
+               columns["team_1"][frame_num], columns["team_2"][frame_num],
+               columns["team_1_window"][frame_num], columns["team_2_window"][frame_num])
+
+def guardar_datos(tracks, team_ball_control, video_id, keyspace=KEYSPACE):
+    cassandra = CassandraConnection(keyspace)
+    cassandra.connect()
+    crear_tablas(cassandra)
+
+    colores_equipo = {}
 
-        # Ejecutar el lote si alcanza el tamaño definido
-        if len(batch) >= batch_size:
-            cassandra.execute_batch(query_balon, batch)
-            batch = []  # Reiniciar el lote
+    def filas_jugadores():
+        for frame_num, players in enumerate(tracks['players']):
+            yield from filas_jugadores_cuadro(video_id, frame_num, players, colores_equipo)
 
-    # Ejecutar cualquier resto del lote
-    if batch:
-        cassandra.execute_batch(query_balon, batch)
+    def filas_balon():
+        for frame_num, ball in enumerate(tracks['ball']):
+            equipo_en_control = team_ball_control[frame_num] if frame_num < len(team_ball_control) else None
+            yield fila_balon_cuadro(video_id, frame_num, ball, equipo_en_control)
 
+    # Escrituras concurrentes en lotes UNLOGGED agrupados por la clave de
+    # partición (id_video, posición 1 de cada fila). 'balon' se escribe
+    # después de terminar 'jugadores', como espera verificar_existencia_y_limpiar
+    registrar_inicio(cassandra, video_id, ["jugadores", "balon"])
+    with cassandra.writer() as writer:
+        writer.write(QUERY_JUGADORES, filas_jugadores(), partition_key=(1,))
+        writer.flush()
+        writer.write(QUERY_BALON, filas_balon(), partition_key=(1,))
+    registrar_completo(cassandra, video_id, len(tracks['players']))
 
     # Cerrar conexión
     cassandra.close()
     print(f"Datos del video {video_id} guardados correctamente.")
 
-def verificar_existencia_y_limpiar(video_id, keyspace="analitica_deportes"):
+def guardar_posesion(possession, video_id, keyspace=KEYSPACE):
+    # Guarda la posesión ya calculada por PossessionStats (acumulada y de la
+    # ventana móvil) para que los consumidores no tengan que recalcularla
     cassandra = CassandraConnection(keyspace)
     cassandra.connect()
+    crear_tablas(cassandra)
 
-    # Consultas para verificar la existencia del video en las tablas
-    query_check_jugadores = "SELECT COUNT(*) FROM jugadores WHERE id_video = ?"
-    query_check_balon = "SELECT COUNT(*) FROM balon WHERE id_video = ?"
+    columns = {name: column.tolist() for name, column in possession.to_columns().items()}
+    filas = filas_posesion(video_id, columns, range(len(columns["team_ball_control"])))
 
-    # Ejecutar consultas
-    result_jugadores = cassandra.execute_query(query_check_jugadores, [video_id])
-    result_balon = cassandra.execute_query(query_check_balon, [video_id])
+    registrar_inicio(cassandra, video_id, ["posesion"])
+    with cassandra.writer() as writer:
+        writer.write(QUERY_POSESION, filas, partition_key=(0,))
 
-    exists_in_jugadores = result_jugadores[0].count > 0
-    exists_in_balon = result_balon[0].count > 0
+    cassandra.close()
+    print(f"Posesión del video {video_id} guardada correctamente.")
+
+TABLAS_VIDEO = ("jugadores", "balon", "posesion")
+
+def leer_progreso(cassandra, video_id):
+    rows = list(cassandra.execute_query(
+        "SELECT tablas, ultimo_cuadro, cuadros, completo FROM progreso_video WHERE id_video = ?", [video_id]))
+    return rows[0] if rows else None
+
+def registrar_inicio(cassandra, video_id, tablas):
+    # Antes de la primera escritura: las tablas que podrían quedar a medias
+    cassandra.execute_query("""
+    UPDATE progreso_video SET tablas = tablas + ?, actualizado = toTimestamp(now()) WHERE id_video = ?
+    """, (set(tablas), video_id))
+
+def registrar_checkpoint(cassandra, video_id, ultimo_cuadro):
+    cassandra.execute_query("""
+    UPDATE progreso_video SET ultimo_cuadro = ?, actualizado = toTimestamp(now()) WHERE id_video = ?
+    """, (ultimo_cuadro, video_id))
+
+def registrar_completo(cassandra, video_id, cuadros=None, tablas=()):
+    # Una sola escritura de una fila, atómica: el video está completo o no
+    ultimo_cuadro = cuadros - 1 if cuadros is not None else None
+    cassandra.execute_query("""
+    UPDATE progreso_video SET tablas = tablas + ?, ultimo_cuadro = ?, cuadros = ?, completo = true,
+    actualizado = toTimestamp(now()) WHERE id_video = ?
+    """, (set(tablas), ultimo_cuadro, cuadros, video_id))
+
+def limpiar_video(cassandra, video_id, tablas):
+    # Borrado de la partición entera del video en cada tabla del manifiesto
+    for tabla in TABLAS_VIDEO:
+        if tabla in tablas:
+            cassandra.execute_query(f"DELETE FROM {tabla} WHERE id_video = ?", (video_id,))
+    cassandra.execute_query("DELETE FROM progreso_video WHERE id_video = ?", (video_id,))
+
+def verificar_existencia_y_limpiar(video_id, keyspace=KEYSPACE):
+    cassandra = CassandraConnection(keyspace)
+    cassandra.connect()
+    crear_tablas(cassandra)
+
+    # El manifiesto del video dice en una sola lectura si está completo, si se
+    # puede reanudar desde su checkpoint o qué particiones hay que borrar
+    progreso = leer_progreso(cassandra, video_id)
+    if progreso is not None:
+        if progreso.completo:
+            print(f"El video {video_id} ya fue procesado por completo. No se realizará ninguna acción.")
+            status = "exists_in_both"
+        elif progreso.ultimo_cuadro is not None and progreso.ultimo_cuadro >= 0:
+            print(f"El video {video_id} quedó a medias; se reanudará desde el cuadro {progreso.ultimo_cuadro + 1}.")
+            status = "in_progress"
+        else:
+            print(f"El video {video_id} quedó a medias sin cuadros confirmados. Se borrarán sus datos para volver a generarlos.")
+            limpiar_video(cassandra, video_id, progreso.tablas or ())
+            status = "does_not_exist"
+        cassandra.close()
+        return status
+
+    # Videos guardados antes del manifiesto: basta con leer una fila de cada
+    # tabla para saber si el video tiene datos
+    query_check_jugadores = "SELECT id_video FROM jugadores WHERE id_video = ? LIMIT 1"
+    query_check_balon = "SELECT id_video FROM balon WHERE id_video = ? LIMIT 1"
+
+    exists_in_jugadores = len(list(cassandra.execute_query(query_check_jugadores, [video_id]))) > 0
+    exists_in_balon = len(list(cassandra.execute_query(query_check_balon, [video_id]))) > 0
 
     # Mensajes para consola y limpieza si es necesario
     if exists_in_jugadores and exists_in_balon:
         print(f"El video {video_id} ya existe en ambas tablas. No se realizará ninguna acción.")
+        # Se completa el manifiesto para que la próxima comprobación lea una sola fila
+        registrar_completo(cassandra, video_id, tablas=["jugadores", "balon"])
         status = "exists_in_both"
     elif exists_in_jugadores and not exists_in_balon:
         print(f"El video {video_id} se encontró en la tabla 'jugadores' pero no en 'balon'.")
         print(f"Se borrarán los datos de 'jugadores' para volver a generarlos.")
-        query_delete_jugadores = """
-        DELETE FROM jugadores WHERE id_video = ?
-        """
-        cassandra.execute_query(query_delete_jugadores, (video_id,))
+        limpiar_video(cassandra, video_id, ["jugadores"])
         status = "exists_in_jugadores"
     elif not exists_in_jugadores and exists_in_balon:
         print(f"El video {video_id} se encontró en la tabla 'balon' pero no en 'jugadores'.")
         print(f"Se borrarán los datos de 'balon' para volver a generarlos.")
-        query_delete_balon = """
-        DELETE FROM balon WHERE id_video = ?
-        """
-        cassandra.execute_query(query_delete_balon, (video_id,))
+        limpiar_video(cassandra, video_id, ["balon"])
         status = "exists_in_balon"
     else:
         print(f"El video {video_id} no existe en ninguna tabla. Se procederá a guardarlo por primera vez.")
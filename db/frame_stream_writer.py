@@ -0,0 +1,114 @@
+import queue
+import sys
+import threading
+from db.cassandra_connection import CassandraConnection
+from db.dao import (KEYSPACE, QUERY_BALON, QUERY_JUGADORES, QUERY_POSESION, crear_tablas,
+                    fila_balon_cuadro, filas_jugadores_cuadro, filas_posesion, leer_progreso,
+                    registrar_checkpoint, registrar_completo, registrar_inicio)
+
+class FrameStreamWriter:
+    # Saves the player, ball and possession rows of a video frame by frame
+    # while the video is still being drawn and encoded. Frames are handed to a
+    # background thread that writes them with a CassandraWriter in chunks of
+    # checkpoint_frames frames; once a chunk is acknowledged, the last frame
+    # of the chunk is stored in the progreso_video manifest. After a crash the next run
+    # skips every frame up to that checkpoint (the rows after it are upserts,
+    # so writing them again is harmless) instead of deleting the video's rows.
+    # With max_pending_frames > 0, add_frame blocks when the thread falls that
+    # far behind.
+    def __init__(self, video_id, keyspace=KEYSPACE, checkpoint_frames=48, max_pending_frames=256, **writer_options):
+        self.video_id = video_id
+        self.checkpoint_frames = checkpoint_frames
+        self.cassandra = CassandraConnection(keyspace)
+        self.writer_options = writer_options
+        self.frames = queue.Queue(max_pending_frames)
+        self.thread = None
+        self.error = None
+        self.resume_frame = 0
+        self.last_committed = -1
+        self.possession_columns = None
+        self.colores_equipo = {}
+
+    def start(self):
+        self.cassandra.connect()
+        crear_tablas(self.cassandra)
+        progreso = leer_progreso(self.cassandra, self.video_id)
+        if progreso is not None and progreso.ultimo_cuadro is not None and progreso.ultimo_cuadro >= 0:
+            self.last_committed = progreso.ultimo_cuadro
+            self.resume_frame = progreso.ultimo_cuadro + 1
+            print(f"Reanudando el guardado del video {self.video_id} desde el cuadro {self.resume_frame}.")
+        # The manifest lists the tables before any row reaches them, so a
+        # crash before the first checkpoint is cleaned up partition by partition
+        registrar_inicio(self.cassandra, self.video_id, ["jugadores", "balon", "posesion"])
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def add_frame(self, frame_num, tracks, team_ball_control, possession):
+        # Frames must be added in order
+        if self.error is not None:
+            raise self.error
+        if frame_num < self.resume_frame:
+            return
+        if self.possession_columns is None:
+            self.possession_columns = {name: column.tolist() for name, column in possession.to_columns().items()}
+
+        equipo_en_control = team_ball_control[frame_num] if frame_num < len(team_ball_control) else None
+        self.frames.put((
+            frame_num,
+            list(filas_jugadores_cuadro(self.video_id, frame_num, tracks['players'][frame_num], self.colores_equipo)),
+            fila_balon_cuadro(self.video_id, frame_num, tracks['ball'][frame_num], equipo_en_control),
+            next(filas_posesion(self.video_id, self.possession_columns, [frame_num])),
+        ))
+
+    def run(self):
+        writer = self.cassandra.writer(**self.writer_options)
+        chunk = []
+        while True:
+            item = self.frames.get()
+            if self.error is not None:
+                # Keep draining so add_frame never blocks on a dead thread
+                if item is None:
+                    return
+                continue
+            if item is not None:
+                chunk.append(item)
+            if chunk and (item is None or len(chunk) >= self.checkpoint_frames):
+                try:
+                    self.commit(writer, chunk)
+                except Exception as e:
+                    self.error = e
+                chunk = []
+            if item is None:
+                return
+
+    def commit(self, writer, chunk):
+        writer.write(QUERY_JUGADORES, (fila for _, filas, _, _ in chunk for fila in filas), partition_key=(1,))
+        writer.write(QUERY_BALON, (balon for _, _, balon, _ in chunk), partition_key=(1,))
+        writer.write(QUERY_POSESION, (posesion for _, _, _, posesion in chunk), partition_key=(0,))
+        writer.flush()
+        # Every row up to this frame is acknowledged: move the checkpoint
+        self.last_committed = chunk[-1][0]
+        registrar_checkpoint(self.cassandra, self.video_id, self.last_committed)
+
+    def close(self, completed=True):
+        # completed: the whole video (rows and output file) is done. Otherwise
+        # only the frames received so far are committed. Callers close from
+        # a finally block: while another exception is propagating, a write
+        # error is only reported so that it does not replace that exception.
+        try:
+            if self.thread is not None:
+                self.frames.put(None)
+                self.thread.join()
+                self.thread = None
+            if self.error is not None:
+                if sys.exc_info()[1] is not None:
+                    print(f"Error al guardar el video {self.video_id}: {self.error!r}")
+                    return
+                raise self.error
+            if completed:
+                registrar_completo(self.cassandra, self.video_id, self.last_committed + 1)
+                print(f"Datos del video {self.video_id} guardados correctamente.")
+        finally:
+            self.cassandra.close()
@@ -0,0 +1 @@
+from .frame_store import FrameStore
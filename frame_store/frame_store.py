@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import cv2
+import numpy as np
+from utils.video_utils import VideoReader
+
+class FrameStore:
+    # Decoded frames of a video in a raw uint8 file on local disk, mapped
+    # with np.memmap as a (num_frames, height, width, channels) array.
+    # Indexing returns views into the mapping, so stages read frames without
+    # copying them and the OS page cache (not the process heap) decides which
+    # frames stay in RAM. A frame list only needs to support len() and
+    # indexing, so a store can replace the list from read_video for every
+    # stage; the mapping is read-only, so drawing works on copies.
+    # from_video can also write a grayscale proxy, downscaled by proxy_scale,
+    # in the same decode pass for the optical flow of the camera movement.
+    # Full-resolution BGR takes width*height*3 bytes per frame on disk.
+    def __init__(self, path, shape):
+        self.path = path
+        self.frames = np.memmap(path, dtype=np.uint8, mode='r', shape=tuple(shape))
+        self.proxy = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.frames[i] for i in range(*index.indices(len(self.frames)))]
+        return self.frames[index]
+
+    def __iter__(self):
+        for frame_num in range(len(self.frames)):
+            yield self.frames[frame_num]
+
+    @property
+    def height(self):
+        return self.frames.shape[1]
+
+    @property
+    def width(self):
+        return self.frames.shape[2]
+
+    @classmethod
+    def from_video(cls, video_path, store_dir='./cache/frames', proxy_scale=None):
+        # Decodes the video once; a store left by an earlier call for the
+        # same file (path, size and modification time) is reused
+        os.makedirs(store_dir, exist_ok=True)
+        stat = os.stat(video_path)
+        digest = hashlib.sha256(f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+        base = os.path.join(store_dir, f"{os.path.splitext(os.path.basename(video_path))[0]}-{digest[:16]}")
+        header_path = base + ".json"
+
+        header = None
+        if os.path.exists(header_path):
+            with open(header_path) as f:
+                header = json.load(f)
+            if header["proxy_scale"] != proxy_scale:
+                header = None
+        if header is None:
+            header = cls.decode(video_path, base, proxy_scale)
+            # Written last: a store without header is an interrupted decode
+            with open(header_path + ".tmp", "w") as f:
+                json.dump(header, f)
+            os.replace(header_path + ".tmp", header_path)
+
+        store = cls(base + ".bgr", header["shape"])
+        if proxy_scale is not None:
+            store.proxy = cls(base + ".gray", header["proxy_shape"])
+        return store
+
+    @staticmethod
+    def decode(video_path, base, proxy_scale):
+        num_frames = 0
+        with open(base + ".bgr", "wb") as frames_file, open(base + ".gray", "wb") as proxy_file:
+            shape = proxy_shape = None
+            for frame in VideoReader(video_path):
+                shape = frame.shape
+                frames_file.write(np.ascontiguousarray(frame).data)
+                if proxy_scale is not None:
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    if proxy_scale != 1.0:
+                        gray = cv2.resize(gray, None, fx=proxy_scale, fy=proxy_scale, interpolation=cv2.INTER_AREA)
+                    proxy_shape = gray.shape
+                    proxy_file.write(np.ascontiguousarray(gray).data)
+                num_frames += 1
+
+        if num_frames == 0:
+            raise ValueError("No frames were read from the video. Please check the video file.")
+        return {
+            "shape": [num_frames, *shape],
+            "proxy_shape": [num_frames, *proxy_shape] if proxy_shape is not None else None,
+            "proxy_scale": proxy_scale,
+        }
+
+    def remove(self):
+        # Deletes the files of this store (and its proxy)
+        base = os.path.splitext(self.path)[0]
+        self.frames = None
+        if self.proxy is not None:
+            self.proxy.frames = None
+        for extension in (".json", ".bgr", ".gray"):
+            if os.path.exists(base + extension):
+                os.remove(base + extension)
@@ -1,129 +1,391 @@
+import argparse
+import functools
 import os
-from db.dao import guardar_datos, verificar_existencia_y_limpiar
-from utils import read_video, save_video
-from trackers import Tracker
+from db.dao import verificar_existencia_y_limpiar
+from db.frame_stream_writer import FrameStreamWriter
+from utils import read_video, read_video_frames, get_video_properties, open_video_writer, save_video
+from trackers import Tracker, TrackTable
 import time
-import numpy as np
 from team_assigner import TeamAssigner
-from player_ball_assigner import PlayerBallAssigner
+from player_ball_assigner import PlayerBallAssigner, PossessionStats
 from camera_movement_estimator import CameraMovementEstimator
 from view_transformer import ViewTransformer
 from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from pipeline import PipelineExecutor
+from track_cache import TrackCache
+from frame_store import FrameStore
+from batch_runner import BatchRunner
+
+
+def process_video(video_path, output_path, video_id, streaming=False, cache=None, tracker=None, frame_store_dir=None,
+                  video_options=None, camera_workers=1, camera_mode='max_displacement', ball_index=False):
+    # video_options: codec and preview options of the output (see open_video_writer)
+    # ball_index: assign the ball with PlayerBallAssigner's k-d tree
+    video_options = video_options or {}
+    if streaming:
+        return process_video_streaming(video_path, output_path, video_id, cache=cache, tracker=tracker,
+                                       video_options=video_options, camera_mode=camera_mode,
+                                       ball_index=ball_index)
 
-
-def process_video(video_path, output_path, video_id):
     start_time = time.time()
     print(f"Processing video: {video_path}")
 
-    # Read Video
-    video_frames = read_video(video_path)
+    # Read Video. With frame_store_dir the frames are decoded once into a
+    # memory-mapped file on disk instead of a list in RAM, plus a grayscale
+    # proxy for the optical flow at the scale the camera estimator works at
+    frame_store = None
+    if frame_store_dir:
+        frame_store = FrameStore.from_video(video_path, frame_store_dir,
+                                            proxy_scale=CameraMovementEstimator.working_scale(camera_mode))
+        video_frames = frame_store
+    else:
+        video_frames = read_video(video_path)
     print(f"Time to read video: {time.time() - start_time}")
 
-    # Initialize Tracker
+    try:
+        process_video_frames(video_path, output_path, video_id, video_frames, frame_store, cache, tracker,
+                             video_options, camera_workers, camera_mode, ball_index)
+    finally:
+        # Also after a failed job: the store takes several GB on disk
+        if frame_store is not None:
+            frame_store.remove()
+
+
+def process_video_frames(video_path, output_path, video_id, video_frames, frame_store, cache, tracker,
+                         video_options, camera_workers, camera_mode, ball_index):
+    # Initialize Tracker (a batch worker passes in its already loaded one)
     start_time1 = time.time()
-    tracker = Tracker('./models/best.pt')
+    if tracker is None:
+        tracker = Tracker('./models/best.pt')
+    tracker.reset()
 
     tracks = tracker.get_object_tracks(video_frames,
-                                       read_from_stub=True,
-                                       stub_path='./stubs/track_stubs.pkl')
+                                       cache=cache,
+                                       cache_key=tracker.get_cache_key(cache, video_path) if cache else None)
+
+    # Columnar view of the tracks used by every following stage; the nested
+    # dicts of the tracker are dropped
+    table = TrackTable.from_tracks(tracks)
+    tracks = None
 
     # Get object positions
-    tracker.add_position_to_tracks(tracks)
+    tracker.add_position_to_table(table)
 
     print(f"Time to track objects: {time.time() - start_time1}")
 
     # Camera movement estimator
     start_time2 = time.time()
-    camera_movement_estimator = CameraMovementEstimator(video_frames[0])
-    camera_movement_per_frame = camera_movement_estimator.get_camera_movement(video_frames,
-                                                                               read_from_stub=True,
-                                                                               stub_path='./stubs/camera_movement_stub.pkl')
-    camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
+    camera_movement_estimator = CameraMovementEstimator(video_frames[0], mode=camera_mode)
+    camera_cache_key = camera_movement_estimator.get_cache_key(cache, video_path) if cache else None
+    if camera_workers > 1:
+        # Chunks of the video in parallel worker processes (each decodes its own frames)
+        camera_movement_per_frame = camera_movement_estimator.get_camera_movement_chunked(
+            video_path, num_workers=camera_workers, cache=cache, cache_key=camera_cache_key)
+    else:
+        camera_movement_per_frame = camera_movement_estimator.get_camera_movement(
+            frame_store.proxy if frame_store is not None else video_frames,
+            cache=cache,
+            cache_key=camera_cache_key)
+    camera_movement_estimator.add_adjust_positions_to_table(table, camera_movement_per_frame)
 
     print(f"Time to estimate camera movement: {time.time() - start_time2}")
 
     # View Transformer
     start_time3 = time.time()
     view_transformer = ViewTransformer()
-    view_transformer.add_transformed_position_to_tracks(tracks)
+    view_transformer.add_transformed_position_to_table(table)
     print(f"Time to transform view: {time.time() - start_time3}")
 
     # Interpolate Ball Positions
     start_time4 = time.time()
-    tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
+    table = tracker.interpolate_ball_positions_table(table)
     print(f"Time to interpolate ball positions: {time.time() - start_time4}")
 
     # Speed and Distance Estimator
     start_time5 = time.time()
-    speed_and_distance_estimator = SpeedAndDistance_Estimator()
-    speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
+    speed_and_distance_estimator = SpeedAndDistance_Estimator.from_video(video_path)
+    speed_and_distance_estimator.add_speed_and_distance_to_table(table)
     print(f"Time to estimate speed and distance: {time.time() - start_time5}")
 
     # Assign Player Teams
     start_time6 = time.time()
     team_assigner = TeamAssigner()
-    team_assigner.assign_team_color(video_frames[0],
-                                    tracks['players'][0])
-
-    for frame_num, player_track in enumerate(tracks['players']):
-        if frame_num >= len(video_frames):
-            break
-        for player_id, track in player_track.items():
-            team = team_assigner.get_player_team(video_frames[frame_num],
-                                                 track['bbox'],
-                                                 player_id)
-            tracks['players'][frame_num][player_id]['team'] = team
-            tracks['players'][frame_num][player_id]['team_color'] = team_assigner.team_colors[team]
-
+    team_assigner.add_team_to_table(table, video_frames)
     print(f"Time to assign player teams: {time.time() - start_time6}")
 
     # Assign Ball Acquisition
     start_time7 = time.time()
-    player_assigner = PlayerBallAssigner()
-    team_ball_control = []
-    for frame_num, player_track in enumerate(tracks['players']):
-        ball_bbox = tracks['ball'][frame_num][1]['bbox']
-        assigned_player = player_assigner.assign_ball_to_player(player_track, ball_bbox)
-
-        if assigned_player != -1:
-            if 'team' in tracks['players'][frame_num][assigned_player]:
-                tracks['players'][frame_num][assigned_player]['has_ball'] = True
-                team_ball_control.append(tracks['players'][frame_num][assigned_player]['team'])
-            else:
-                team_ball_control.append(team_ball_control[-1])
-        else:
-            team_ball_control.append(team_ball_control[-1])
-    team_ball_control = np.array(team_ball_control)
+    player_assigner = PlayerBallAssigner(indexed=ball_index)
+    team_ball_control = player_assigner.assign_ball_to_table(table)
+    # The output keeps the fps of the source video
+    fps = get_video_properties(video_path)["fps"] or 24
+    possession = PossessionStats(team_ball_control, frame_rate=fps)
     print(f"Time to assign ball acquisition: {time.time() - start_time7}")
 
-    # Draw output
-    start_time8 = time.time()
-    output_video_frames = tracker.draw_annotations(video_frames, tracks, team_ball_control)
-    print(f"Time to draw object tracks: {time.time() - start_time8}")
-
-    # Save video
-    print("Saving video...")
-    save_video(output_video_frames, output_path)
-    print(f"Video saved to {output_path}")
+    # Drawing and the DAO read the table one frame at a time
+    tracks = table.view()
 
-    # Save to Cassandra
+    # Save to Cassandra in the background while the video is drawn and saved
     print("Saving to Cassandra...")
-    guardar_datos(tracks, team_ball_control, video_id=video_id)
+    stream = FrameStreamWriter(video_id, max_pending_frames=0).start()
+    completed = False
+    try:
+        for frame_num in range(len(tracks['players'])):
+            stream.add_frame(frame_num, tracks, team_ball_control, possession)
+
+        if frame_store is not None:
+            # The store is read-only: every frame is drawn on a copy and
+            # written right away, so the output never has to fit in RAM
+            start_time8 = time.time()
+            writer = open_video_writer(output_path, (frame_store.width, frame_store.height), fps=fps, **video_options)
+            try:
+                for frame_num, frame in enumerate(frame_store):
+                    writer.write(tracker.draw_frame_annotations(frame.copy(), frame_num, tracks, possession))
+            finally:
+                writer.release()
+            print(f"Time to draw and save the video: {time.time() - start_time8}")
+        else:
+            # Draw output
+            start_time8 = time.time()
+            output_video_frames = tracker.draw_annotations(video_frames, tracks, possession, in_place=True)
+            print(f"Time to draw object tracks: {time.time() - start_time8}")
+
+            # Save video
+            print("Saving video...")
+            save_video(output_video_frames, output_path, fps=fps, **video_options)
+        print(f"Video saved to {output_path}")
+        completed = True
+    finally:
+        stream.close(completed)
     print("Saved to Cassandra!")
 
 
+def process_video_streaming(video_path, output_path, video_id, cache=None, tracker=None, video_options=None,
+                            camera_mode='max_displacement', ball_index=False):
+    # Two streaming passes over the video so that memory stays flat regardless
+    # of its length. The first pass runs detection, tracking, camera movement
+    # and team assignment; the second pass decodes the video again and writes
+    # every annotated frame as soon as it is drawn. No frame is kept, only the
+    # tracks of the whole video: about 11 KB per frame (with 22 players) as the
+    # tracker's nested dicts during the first pass, then about 3 KB per frame
+    # in the TrackTable the second pass reads frame by frame. Each pass runs
+    # as a pipeline with one thread per stage linked by bounded queues.
+    start_time = time.time()
+    print(f"Processing video (streaming): {video_path}")
+
+    if tracker is None:
+        tracker = Tracker('./models/best.pt')
+    tracker.reset()
+    team_assigner = TeamAssigner()
+    camera_movement_estimator = None
+
+    # Cached results let the first pass skip YOLO and/or optical flow
+    tracks_key = tracker.get_cache_key(cache, video_path) if cache else None
+    cached_tracks = cache.get_tracks(tracks_key) if cache else None
+    tracks = cached_tracks if cached_tracks is not None else tracker.new_tracks()
+    camera_movement_per_frame = []
+    cached_camera_movement = None
+
+    def detect(batch):
+        # Batch sizes within the window are picked by the inference scheduler
+        detections = tracker.detect_frames([frame for _, frame in batch])
+        return [(frame_num, frame, detection) for (frame_num, frame), detection in zip(batch, detections)]
+
+    def detect_with_stride(batch):
+        # With a detection stride the frames to detect depend on the tracks so
+        # far, so detection and tracking run in one stage, a window at a time
+        tracker.add_frames_with_stride(tracks, batch[0][0], [frame for _, frame in batch])
+        for frame_num, frame in batch:
+            track((frame_num, frame, None))
+        return []
+
+    def track(item):
+        nonlocal camera_movement_estimator, cached_camera_movement
+        frame_num, frame, detection = item
+        if detection is not None:
+            tracker.add_detection_to_tracks(tracks, frame_num, detection, frame)
+        if frame_num >= len(tracks['players']):
+            return
+
+        if frame_num == 0:
+            camera_movement_estimator = CameraMovementEstimator(frame, mode=camera_mode)
+            if cache:
+                cached_camera_movement = cache.get_camera_movement(
+                    camera_movement_estimator.get_cache_key(cache, video_path))
+            if cached_camera_movement is None:
+                camera_movement_estimator.start_stream(frame)
+                camera_movement_per_frame.append([0, 0])
+            team_assigner.assign_team_color(frame, tracks['players'][0])
+        elif cached_camera_movement is None:
+            camera_movement_per_frame.append(camera_movement_estimator.update_stream(frame))
+
+        players = tracks['players'][frame_num]
+        teams = team_assigner.get_player_teams(frame,
+                                               [player['bbox'] for player in players.values()],
+                                               list(players.keys()))
+        for player, team in zip(players.values(), teams):
+            player['team'] = team
+            player['team_color'] = team_assigner.team_colors[team]
+
+    # First pass: detection, tracking, camera movement and team assignment
+    executor = PipelineExecutor()
+    if cached_tracks is None and tracker.detection_stride.stride > 1:
+        executor.add_stage("tracking", detect_with_stride, batch_size=tracker.detection_window())
+    elif cached_tracks is None:
+        executor.add_stage("inference", detect, batch_size=tracker.detection_window())
+        executor.add_stage("tracking", track)
+    else:
+        executor.add_stage("tracking", lambda item: track((*item, None)))
+    executor.run(enumerate(read_video_frames(video_path)))
+    print(executor.report())
+    if cached_tracks is None and tracker.detection_stride.stride > 1:
+        tracker.report_stride(len(tracks['players']))
+
+    if camera_movement_estimator is None:
+        raise ValueError("No frames were read from the video. Please check the video file.")
+    if cached_camera_movement is not None:
+        camera_movement_per_frame = cached_camera_movement
+    if cache:
+        if cached_tracks is None:
+            cache.put_tracks(tracks_key, tracks)
+        if cached_camera_movement is None:
+            cache.put_camera_movement(camera_movement_estimator.get_cache_key(cache, video_path),
+                                      camera_movement_per_frame)
+    print(f"Time to track objects and estimate camera movement: {time.time() - start_time}")
+
+    start_time1 = time.time()
+    table = TrackTable.from_tracks(tracks)
+    tracks = cached_tracks = None
+    tracker.add_position_to_table(table)
+    camera_movement_estimator.add_adjust_positions_to_table(table, camera_movement_per_frame)
+    ViewTransformer().add_transformed_position_to_table(table)
+    table = tracker.interpolate_ball_positions_table(table)
+    SpeedAndDistance_Estimator.from_video(video_path).add_speed_and_distance_to_table(table)
+    team_ball_control = PlayerBallAssigner(indexed=ball_index).assign_ball_to_table(table)
+    tracks = table.view()
+    properties = get_video_properties(video_path)
+    possession = PossessionStats(team_ball_control, frame_rate=properties["fps"] or 24)
+    print(f"Time to enrich tracks: {time.time() - start_time1}")
+
+    # Second pass: draw and encode frame by frame, saving every frame's rows
+    # to Cassandra in the background as it goes
+    start_time2 = time.time()
+    writer = open_video_writer(output_path, (properties["width"], properties["height"]),
+                               fps=properties["fps"] or 24, **(video_options or {}))
+    stream = FrameStreamWriter(video_id).start()
+
+    def draw(item):
+        frame_num, frame = item
+        if frame_num >= len(tracks["players"]):
+            return None
+        stream.add_frame(frame_num, tracks, team_ball_control, possession)
+        return tracker.draw_frame_annotations(frame, frame_num, tracks, possession)
+
+    completed = False
+    try:
+        executor = PipelineExecutor()
+        executor.add_stage("draw", draw)
+        executor.add_stage("encode", writer.write)
+        executor.run(enumerate(read_video_frames(video_path)))
+        writer.release()
+        completed = True
+    finally:
+        try:
+            # Only releases what a failed run left open
+            writer.release()
+        finally:
+            stream.close(completed)
+    print(executor.report())
+    print(f"Time to draw and save video: {time.time() - start_time2}")
+    print(f"Video saved to {output_path}")
+    print("Saved to Cassandra!")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Análisis de videos de fútbol")
+    parser.add_argument("--batch", action="store_true",
+                        help="procesar todos los videos de la carpeta de entrada sin preguntas")
+    parser.add_argument("--workers", type=int, default=1, help="número de procesos worker del modo batch")
+    parser.add_argument("--queue-dir", default="./jobs", help="carpeta de la cola de trabajos del modo batch")
+    parser.add_argument("--streaming", action="store_true", help="usar el modo streaming (bajo uso de memoria)")
+    parser.add_argument("--detect-stride", type=int, default=1,
+                        help="ejecutar YOLO cada k cuadros y predecir el movimiento en los intermedios")
+    parser.add_argument("--ball-roi", action="store_true",
+                        help="buscar el balón en alta resolución alrededor de su posición prevista cuando no se detecta")
+    parser.add_argument("--backend", choices=["pytorch", "onnx", "openvino"], default="pytorch",
+                        help="motor de inferencia del detector (onnx y openvino se ejecutan en CPU)")
+    parser.add_argument("--int8", action="store_true", help="cuantizar el modelo a INT8 (solo openvino)")
+    parser.add_argument("--int8-data", default=None,
+                        help="dataset YOLO (.yaml) para calibrar la cuantización INT8")
+    parser.add_argument("--frame-store", default=None, metavar="DIR",
+                        help="decodificar los cuadros una vez en un archivo mapeado en memoria en DIR "
+                             "en lugar de mantenerlos en RAM (modo no streaming)")
+    parser.add_argument("--camera-workers", type=int, default=1,
+                        help="procesos para estimar el movimiento de cámara por tramos en paralelo (modo no streaming)")
+    parser.add_argument("--camera-mode", choices=["max_displacement", "affine", "homography"],
+                        default="max_displacement",
+                        help="método de estimación del movimiento de cámara (affine y homography trabajan "
+                             "a media resolución, también con --frame-store)")
+    parser.add_argument("--ball-index", action="store_true",
+                        help="asignar el balón al jugador más cercano con un índice k-d tree "
+                             "(muchos jugadores o varios balones por cuadro)")
+    parser.add_argument("--codec", default="auto",
+                        help="códec del video de salida: h264 (con ffmpeg), mp4v, XVID u otro fourcc de OpenCV; "
+                             "auto usa h264 si ffmpeg está disponible")
+    parser.add_argument("--preview-scale", type=float, default=None,
+                        help="escribir además una vista previa reducida a esta escala (p. ej. 0.25)")
+    return parser.parse_args()
+
+
+def tracker_options(args):
+    options = {"detect_stride": args.detect_stride, "ball_roi": args.ball_roi, "backend": args.backend}
+    if args.backend != "pytorch":
+        options.update(int8=args.int8, calibration_data=args.int8_data)
+    return options
+
+
+def video_options(args):
+    return {"codec": args.codec, "preview_scale": args.preview_scale}
+
+
+def run_batch(args, input_folder, output_folder):
+    # Cola de trabajos en disco: si el proceso se interrumpe, la siguiente
+    # ejecución retoma los videos pendientes o a medio procesar
+    process_func = functools.partial(process_video, frame_store_dir=args.frame_store,
+                                     video_options=video_options(args), camera_workers=args.camera_workers,
+                                     camera_mode=args.camera_mode, ball_index=args.ball_index)
+    runner = BatchRunner(process_func, queue_dir=args.queue_dir, num_workers=args.workers,
+                         cache_dir='./cache', streaming=args.streaming, tracker_options=tracker_options(args))
+    enqueued = runner.enqueue_folder(input_folder, output_folder)
+    print(f"{enqueued} videos nuevos en la cola ({runner.queue.counts()['pending']} pendientes).")
+    runner.run()
+
+
 def main():
     input_folder = './input_videos'
     output_folder = './output_videos'
 
+    args = parse_args()
+    if args.batch:
+        return run_batch(args, input_folder, output_folder)
+
     os.makedirs(output_folder, exist_ok=True)
 
+    # Caché de tracks y movimiento de cámara indexada por el contenido de cada video
+    cache = TrackCache('./cache')
+
+    # El modelo se carga una sola vez (con el motor elegido en la línea de comandos)
+    tracker = Tracker('./models/best.pt', **tracker_options(args))
+
     # Preguntar al usuario si desea procesar todos los videos o uno específico
     print("¿Deseas procesar todos los videos o solo un video específico?")
     print("1. Procesar todos los videos")
     print("2. Procesar un video específico")
     choice = input("Elige una opción (1/2): ")
 
+    # El modo streaming mantiene el uso de memoria constante en videos largos
+    streaming = input("¿Usar modo streaming (bajo uso de memoria)? (s/n): ").strip().lower() == "s"
+
     if choice == "1":
         # Procesar todos los videos
         for video_file in os.listdir(input_folder):
@@ -139,9 +401,12 @@ def main():
                 status = verificar_existencia_y_limpiar(video_id)
 
                 # Procesar el video solo si tiene las keys válidas
-                if status in ["exists_in_jugadores", "exists_in_balon", "does_not_exist"]:
+                if status in ["exists_in_jugadores", "exists_in_balon", "does_not_exist", "in_progress"]:
                     print(f"Procesando video {video_id} con estado: {status}...")
-                    process_video(video_path, output_path, video_id)
+                    process_video(video_path, output_path, video_id, streaming=streaming, cache=cache, tracker=tracker,
+                                  frame_store_dir=args.frame_store, video_options=video_options(args),
+                                  camera_workers=args.camera_workers, camera_mode=args.camera_mode,
+                                  ball_index=args.ball_index)
                     print(f"Procesamiento de video {video_file} completado.")
             else:
                 print(f"El archivo {video_file} no es un video compatible, se omitirá.")
@@ -162,9 +427,12 @@ def main():
             status = verificar_existencia_y_limpiar(video_id)
 
             # Procesar el video solo si tiene las keys válidas
-            if status in ["exists_in_jugadores", "exists_in_balon", "does_not_exist"]:
+            if status in ["exists_in_jugadores", "exists_in_balon", "does_not_exist", "in_progress"]:
                 print(f"Procesando video {video_id} con estado: {status}...")
-                process_video(video_path, output_path, video_id)
+                process_video(video_path, output_path, video_id, streaming=streaming, cache=cache, tracker=tracker,
+                              frame_store_dir=args.frame_store, video_options=video_options(args),
+                              camera_workers=args.camera_workers, camera_mode=args.camera_mode,
+                              ball_index=args.ball_index)
                 print(f"Procesamiento de video {video_name} completado.")
         else:
             print(f"El archivo {video_name} no existe en la carpeta {input_folder} o no es un formato compatible.")
@@ -0,0 +1 @@
+from .pipeline_executor import PipelineExecutor, PipelineStage
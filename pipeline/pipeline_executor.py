@@ -0,0 +1,164 @@
+import queue
+import threading
+import time
+
+_END_OF_STREAM = object()
+
+
+class PipelineStage:
+    def __init__(self, name, func, batch_size=1):
+        self.name = name
+        self.func = func
+        self.batch_size = batch_size
+
+        # Statistics filled in while the pipeline runs
+        self.items = 0
+        self.busy_time = 0.0
+        self.starved_time = 0.0
+        self.blocked_time = 0.0
+
+    def throughput(self):
+        # Frames per second the stage could sustain if it never had to wait
+        if self.busy_time == 0:
+            return float('inf')
+        return self.items / self.busy_time
+
+
+# Runs a source iterator and a chain of stages, each on its own thread.
+# Stages are linked by bounded queues, so a slow stage applies backpressure to
+# the ones before it instead of letting frames pile up in memory. A stage with
+# batch_size > 1 receives a list of up to batch_size items and must return a
+# list; other stages receive one item and return the item for the next stage,
+# or None to drop it. The return value of the last stage is discarded.
+class PipelineExecutor:
+    def __init__(self, queue_size=32):
+        self.queue_size = queue_size
+        self.stages = []
+        self.source_stage = None
+        self.elapsed_time = 0.0
+        self._stop_event = threading.Event()
+        self._error = None
+
+    def add_stage(self, name, func, batch_size=1):
+        self.stages.append(PipelineStage(name, func, batch_size))
+        return self
+
+    def run(self, source, source_name="decode"):
+        if not self.stages:
+            raise ValueError("The pipeline needs at least one stage")
+
+        self._stop_event.clear()
+        self._error = None
+        self.source_stage = PipelineStage(source_name, None)
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+
+        threads = [threading.Thread(target=self._run_source,
+                                    args=(self.source_stage, source, queues[0]),
+                                    name=source_name, daemon=True)]
+        for stage_num, stage in enumerate(self.stages):
+            output_queue = queues[stage_num + 1] if stage_num + 1 < len(queues) else None
+            threads.append(threading.Thread(target=self._run_stage,
+                                            args=(stage, queues[stage_num], output_queue),
+                                            name=stage.name, daemon=True))
+
+        start_time = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed_time = time.time() - start_time
+
+        if self._error is not None:
+            raise self._error
+
+    def report(self):
+        stages = [self.source_stage] + self.stages
+        bottleneck = max(stages, key=lambda stage: stage.busy_time)
+        frames = self.stages[-1].items
+
+        lines = [f"{'stage':<12}{'frames':>8}{'busy s':>10}{'fps':>10}{'starved s':>12}{'blocked s':>12}"]
+        for stage in stages:
+            lines.append(f"{stage.name:<12}{stage.items:>8}{stage.busy_time:>10.2f}{stage.throughput():>10.1f}"
+                         f"{stage.starved_time:>12.2f}{stage.blocked_time:>12.2f}")
+        if self.elapsed_time > 0:
+            lines.append(f"Pipeline: {frames} frames in {self.elapsed_time:.2f}s "
+                         f"({frames / self.elapsed_time:.1f} fps), limited by '{bottleneck.name}'")
+        return "\n".join(lines)
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop_event.set()
+
+    def _put(self, stage, output_queue, item):
+        start_time = time.time()
+        while not self._stop_event.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stage.blocked_time += time.time() - start_time
+
+    def _get(self, stage, input_queue):
+        start_time = time.time()
+        item = _END_OF_STREAM
+        while not self._stop_event.is_set():
+            try:
+                item = input_queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        stage.starved_time += time.time() - start_time
+        return item
+
+    def _run_source(self, stage, source, output_queue):
+        try:
+            iterator = iter(source)
+            while not self._stop_event.is_set():
+                start_time = time.time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    stage.busy_time += time.time() - start_time
+                stage.items += 1
+                self._put(stage, output_queue, item)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(stage, output_queue, _END_OF_STREAM)
+
+    def _run_stage(self, stage, input_queue, output_queue):
+        try:
+            finished = False
+            while not finished and not self._stop_event.is_set():
+                batch = []
+                while len(batch) < stage.batch_size:
+                    item = self._get(stage, input_queue)
+                    if item is _END_OF_STREAM:
+                        finished = True
+                        break
+                    batch.append(item)
+                if not batch:
+                    continue
+
+                start_time = time.time()
+                if stage.batch_size > 1:
+                    results = stage.func(batch)
+                else:
+                    results = [stage.func(batch[0])]
+                stage.busy_time += time.time() - start_time
+                stage.items += len(batch)
+
+                if output_queue is None:
+                    continue
+                for result in results:
+                    if result is not None:
+                        self._put(stage, output_queue, result)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if output_queue is not None:
+                self._put(stage, output_queue, _END_OF_STREAM)
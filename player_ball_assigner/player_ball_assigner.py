@@ -1,10 +1,16 @@
+import numpy as np
+from scipy.spatial import cKDTree
 import sys 
 sys.path.append('../')
 from utils import get_center_of_bbox, measure_distance
 
 class PlayerBallAssigner():
-    def __init__(self):
+    # indexed: assign with the k-d tree of assign_balls_to_players_indexed
+    # instead of the dense per-frame scan (same players with one ball per
+    # frame; every ball gets its player when a frame has several)
+    def __init__(self, indexed=False):
         self.max_player_ball_distance = 70
+        self.indexed = indexed
     
     def assign_ball_to_player(self,players,ball_bbox):
         ball_position = get_center_of_bbox(ball_bbox)
@@ -24,4 +30,114 @@ class PlayerBallAssigner():
                     miniumum_distance = distance
                     assigned_player = player_id
 
-        return assigned_player
\ No newline at end of file
+        return assigned_player
+
+    def get_foot_points(self,player_bboxes):
+        # Left and right foot of every player bbox, the points measured to the ball
+        left = np.column_stack([player_bboxes[:,0],player_bboxes[:,3]])
+        right = np.column_stack([player_bboxes[:,2],player_bboxes[:,3]])
+        return left, right
+
+    def get_ball_centers(self,ball_bboxes):
+        # Same integer center as get_center_of_bbox
+        return np.trunc((ball_bboxes[:,:2]+ball_bboxes[:,2:])/2)
+
+    def assign_ball_to_players(self,table):
+        # Assigns the (first) ball of every frame to the closest player for all
+        # frames in one pass. Returns, per frame, the row of the assigned player
+        # in the table (-1 if none) and its team (0 if none).
+        num_frames = table.num_frames
+        assigned_rows = np.full(num_frames,-1,dtype=np.int64)
+        assigned_team = np.zeros(num_frames,dtype=int)
+
+        ball_rows = np.flatnonzero(table.mask('ball'))
+        players = np.flatnonzero(table.mask('players'))
+        if len(ball_rows) == 0 or len(players) == 0:
+            return assigned_rows, assigned_team
+
+        ball_frames, first_ball = np.unique(table.frame[ball_rows],return_index=True)
+        ball_position = np.full((num_frames,2),np.nan)
+        ball_position[ball_frames] = self.get_ball_centers(table.bbox[ball_rows[first_ball]])
+
+        player_frames = table.frame[players]
+        left, right = self.get_foot_points(table.bbox[players])
+        player_ball = ball_position[player_frames]
+        distance = np.minimum(np.hypot(*(left-player_ball).T),np.hypot(*(right-player_ball).T))
+        distance[np.isnan(distance)] = np.inf
+
+        # Closest player per frame: sort by (frame, distance) and keep the first
+        # row of every frame
+        order = np.lexsort((distance,player_frames))
+        first_in_frame = np.r_[True, player_frames[order][1:] != player_frames[order][:-1]]
+        closest = order[first_in_frame]
+        closest = closest[distance[closest] < self.max_player_ball_distance]
+
+        assigned_rows[player_frames[closest]] = players[closest]
+        assigned_team[player_frames[closest]] = table.team[players[closest]]
+        return assigned_rows, assigned_team
+
+    def assign_balls_to_players_indexed(self,table):
+        # Variant for footage with many players or several balls per frame
+        # (training drills): every ball row is matched to the closest foot point
+        # of its frame with a k-d tree query. The frame number is added as a
+        # third coordinate, scaled so that points of different frames are
+        # always farther apart than max_player_ball_distance. Returns the ball
+        # rows with the assigned player row (-1 if none) and team (0 if none).
+        ball_rows = np.flatnonzero(table.mask('ball'))
+        players = np.flatnonzero(table.mask('players'))
+        assigned_rows = np.full(len(ball_rows),-1,dtype=np.int64)
+        assigned_team = np.zeros(len(ball_rows),dtype=int)
+        if len(ball_rows) == 0 or len(players) == 0:
+            return ball_rows, assigned_rows, assigned_team
+
+        frame_scale = 4*self.max_player_ball_distance
+        left, right = self.get_foot_points(table.bbox[players])
+        player_frames = table.frame[players]*frame_scale
+        foot_points = np.vstack([np.column_stack([left,player_frames]),np.column_stack([right,player_frames])])
+        foot_players = np.concatenate([players,players])
+
+        ball_points = np.column_stack([self.get_ball_centers(table.bbox[ball_rows]),table.frame[ball_rows]*frame_scale])
+        valid = ~np.isnan(ball_points).any(axis=1)
+        tree = cKDTree(foot_points)
+        distance, index = tree.query(ball_points[valid],k=1,distance_upper_bound=self.max_player_ball_distance)
+
+        found = np.isfinite(distance) & (distance < self.max_player_ball_distance)
+        valid_rows = np.flatnonzero(valid)
+        assigned_rows[valid_rows[found]] = foot_players[index[found]]
+        assigned_team[valid_rows[found]] = table.team[foot_players[index[found]]]
+        return ball_rows, assigned_rows, assigned_team
+
+    def assign_ball_to_table(self,table):
+        # Marks has_ball and the ball's assigned player on the table and
+        # returns the team in control of the ball for every frame; frames
+        # without an assignment keep the team of the previous frame
+        if self.indexed:
+            assigned_team = self.assign_ball_to_table_indexed(table)
+            has_team = assigned_team != 0
+        else:
+            assigned_rows, assigned_team = self.assign_ball_to_players(table)
+
+            has_team = assigned_team != 0
+            table.has_ball[assigned_rows[has_team]] = True
+
+            ball_rows = np.flatnonzero(table.mask('ball'))
+            ball_frames = table.frame[ball_rows]
+            assigned_ball = has_team[ball_frames]
+            table.assigned_player[ball_rows[assigned_ball]] = table.track_id[assigned_rows[ball_frames[assigned_ball]]]
+
+        last_assigned = np.maximum.accumulate(np.where(has_team,np.arange(table.num_frames),0))
+        team_ball_control = np.where(has_team[last_assigned],assigned_team[last_assigned],0)
+        return team_ball_control
+
+    def assign_ball_to_table_indexed(self,table):
+        # Marks every ball and its player; the team in control of a frame is
+        # the one of its first ball
+        ball_rows, assigned_rows, assigned_team = self.assign_balls_to_players_indexed(table)
+        has_team = assigned_team != 0
+        table.has_ball[assigned_rows[has_team]] = True
+        table.assigned_player[ball_rows[has_team]] = table.track_id[assigned_rows[has_team]]
+
+        frame_team = np.zeros(table.num_frames,dtype=int)
+        ball_frames, first_ball = np.unique(table.frame[ball_rows],return_index=True)
+        frame_team[ball_frames] = assigned_team[first_ball]
+        return frame_team
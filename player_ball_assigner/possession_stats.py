@@ -0,0 +1,43 @@
+import numpy as np
+
+class PossessionStats:
+    # Ball possession per frame, precomputed once from team_ball_control with
+    # prefix sums so that any frame (cumulative or over the last
+    # window_seconds) is a constant-time lookup
+    def __init__(self, team_ball_control, frame_rate=24, window_seconds=300):
+        self.team_ball_control = np.asarray(team_ball_control)
+        self.frame_rate = frame_rate
+        self.window_frames = max(int(window_seconds*frame_rate),1)
+
+        team_1_frames = np.cumsum(self.team_ball_control == 1)
+        team_2_frames = np.cumsum(self.team_ball_control == 2)
+        self.team_1, self.team_2 = self.get_shares(team_1_frames, team_2_frames)
+
+        # Frames in control over the last window_frames frames
+        team_1_window = team_1_frames - np.concatenate([np.zeros(self.window_frames,dtype=int), team_1_frames])[:len(team_1_frames)]
+        team_2_window = team_2_frames - np.concatenate([np.zeros(self.window_frames,dtype=int), team_2_frames])[:len(team_2_frames)]
+        self.team_1_window, self.team_2_window = self.get_shares(team_1_window, team_2_window)
+
+    def __len__(self):
+        return len(self.team_ball_control)
+
+    def get_shares(self, team_1_frames, team_2_frames):
+        total = team_1_frames + team_2_frames
+        team_1 = np.divide(team_1_frames, total, out=np.zeros(len(total)), where=total > 0)
+        team_2 = np.divide(team_2_frames, total, out=np.zeros(len(total)), where=total > 0)
+        return team_1, team_2
+
+    def get_possession(self, frame_num):
+        return self.team_1[frame_num], self.team_2[frame_num]
+
+    def get_window_possession(self, frame_num):
+        return self.team_1_window[frame_num], self.team_2_window[frame_num]
+
+    def to_columns(self):
+        return {
+            "team_ball_control": self.team_ball_control,
+            "team_1": self.team_1,
+            "team_2": self.team_2,
+            "team_1_window": self.team_1_window,
+            "team_2_window": self.team_2_window,
+        }
@@ -1,51 +1,156 @@
+import math
 import cv2
+import numpy as np
 import sys 
 sys.path.append('../')
-from utils import measure_distance ,get_foot_position
+from utils import get_foot_position, get_video_properties
 
 class SpeedAndDistance_Estimator():
-    def __init__(self):
-        self.frame_window=5
-        self.frame_rate=24
-    
-    def add_speed_and_distance_to_tracks(self,tracks):
-        total_distance= {}
+    # Speed (km/h), acceleration (m/s^2) and cumulative distance (m) of every
+    # player track, measured over windows of frame_window frames. All tracks
+    # are computed at once on flat row arrays sorted by (track, frame).
+    # frame_rate should be the fps of the source video (see from_video).
+    # max_speed (km/h) rejects windows faster than any player can run, which
+    # come from tracking or homography glitches; smoothing > 0 replaces each
+    # window's speed by the median of the windows up to `smoothing` before
+    # and after it on the same track.
+    def __init__(self, frame_rate=24, frame_window=5, max_speed=None, smoothing=0):
+        self.frame_window=frame_window
+        self.frame_rate=frame_rate
+        self.max_speed=max_speed
+        self.smoothing=smoothing
+
+    @classmethod
+    def from_video(cls, video_path, **options):
+        return cls(frame_rate=get_video_properties(video_path)["fps"] or 24, **options)
+
+    def compute(self, frames, track_ids, positions, number_of_frames):
+        # Rows of any order: frame, track id and transformed position (NaN
+        # when unknown). Returns speed, acceleration and distance per row,
+        # NaN for rows outside any valid window.
+        frames = np.asarray(frames, dtype=np.int64)
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        speed = np.full(len(frames), np.nan)
+        acceleration = np.full(len(frames), np.nan)
+        distance = np.full(len(frames), np.nan)
+        if len(frames) == 0:
+            return speed, acceleration, distance
+
+        # Rows of a track are found by the key track*number_of_frames+frame
+        _, tracks = np.unique(track_ids, return_inverse=True)
+        keys = tracks*number_of_frames + frames
+        key_order = np.argsort(keys)
+        sorted_keys = keys[key_order]
+
+        def find_rows(query_keys):
+            index = np.minimum(np.searchsorted(sorted_keys, query_keys), len(sorted_keys)-1)
+            return key_order[index], sorted_keys[index] == query_keys
+
+        # One window per track every frame_window frames, in (track, frame)
+        # order
+        starts = key_order[frames[key_order] % self.frame_window == 0]
+        start_frames = frames[starts]
+        last_frames = np.minimum(start_frames+self.frame_window, number_of_frames-1)
+        ends, found = find_rows(tracks[starts]*number_of_frames + last_frames)
+
+        valid = found & (last_frames > start_frames)
+        valid &= ~np.isnan(positions[starts,0]) & ~np.isnan(positions[ends,0])
+        starts, ends = starts[valid], ends[valid]
+        start_frames, last_frames = start_frames[valid], last_frames[valid]
+        window_tracks = tracks[starts]
+
+        displacement = np.sqrt(((positions[ends]-positions[starts])**2).sum(axis=1))
+        time_elapsed = (last_frames-start_frames)/self.frame_rate
+        window_speed = displacement/time_elapsed
+
+        if self.max_speed is not None:
+            plausible = window_speed*3.6 <= self.max_speed
+            starts, window_tracks = starts[plausible], window_tracks[plausible]
+            start_frames, time_elapsed = start_frames[plausible], time_elapsed[plausible]
+            displacement, window_speed = displacement[plausible], window_speed[plausible]
+        if len(starts) == 0:
+            return speed, acceleration, distance
 
+        first_in_track = np.r_[True, window_tracks[1:] != window_tracks[:-1]]
+        if self.smoothing:
+            window_speed = self.median_filter(window_speed, window_tracks)
+
+        # Running total of the distance and change of speed per track
+        cumulative = np.cumsum(displacement)
+        track_start = np.maximum.accumulate(np.where(first_in_track, np.arange(len(cumulative)), 0))
+        total_distance = cumulative - cumulative[track_start] + displacement[track_start]
+        window_acceleration = np.full(len(starts), np.nan)
+        within = np.flatnonzero(~first_in_track)
+        window_acceleration[within] = ((window_speed[within]-window_speed[within-1])
+                                       / (start_frames[within]-start_frames[within-1]) * self.frame_rate)
+
+        # Every row takes the values of the window its frame belongs to
+        window_keys = window_tracks*number_of_frames + start_frames
+        row_window_starts = frames - frames % self.frame_window
+        row_window_keys = tracks*number_of_frames + row_window_starts
+        windows = np.minimum(np.searchsorted(window_keys, row_window_keys), len(window_keys)-1)
+        in_window = (window_keys[windows] == row_window_keys) & (frames < np.minimum(row_window_starts+self.frame_window, number_of_frames-1))
+
+        speed[in_window] = window_speed[windows[in_window]]*3.6
+        acceleration[in_window] = window_acceleration[windows[in_window]]
+        distance[in_window] = total_distance[windows[in_window]]
+        return speed, acceleration, distance
+
+    def median_filter(self, values, groups):
+        # Median over the neighbours within `smoothing` positions that belong
+        # to the same group (values are sorted by group)
+        offsets = np.arange(-self.smoothing, self.smoothing+1)
+        neighbours = np.clip(np.arange(len(values))[:,None] + offsets, 0, len(values)-1)
+        window = np.where(groups[neighbours] == groups[:,None], values[neighbours], np.nan)
+        return np.nanmedian(window, axis=1)
+
+    def add_speed_and_distance_to_tracks(self,tracks):
         for object, object_tracks in tracks.items():
             if object == "ball" or object == "referees":
-                continue 
-            number_of_frames = len(object_tracks)
-            for frame_num in range(0,number_of_frames, self.frame_window):
-                last_frame = min(frame_num+self.frame_window,number_of_frames-1 )
-
-                for track_id,_ in object_tracks[frame_num].items():
-                    if track_id not in object_tracks[last_frame]:
-                        continue
-
-                    start_position = object_tracks[frame_num][track_id]['position_transformed']
-                    end_position = object_tracks[last_frame][track_id]['position_transformed']
-
-                    if start_position is None or end_position is None:
-                        continue
-                    
-                    distance_covered = measure_distance(start_position,end_position)
-                    time_elapsed = (last_frame-frame_num)/self.frame_rate
-                    speed_meteres_per_second = distance_covered/time_elapsed
-                    speed_km_per_hour = speed_meteres_per_second*3.6
-
-                    if object not in total_distance:
-                        total_distance[object]= {}
-                    
-                    if track_id not in total_distance[object]:
-                        total_distance[object][track_id] = 0
-                    
-                    total_distance[object][track_id] += distance_covered
-
-                    for frame_num_batch in range(frame_num,last_frame):
-                        if track_id not in tracks[object][frame_num_batch]:
-                            continue
-                        tracks[object][frame_num_batch][track_id]['speed'] = speed_km_per_hour
-                        tracks[object][frame_num_batch][track_id]['distance'] = total_distance[object][track_id]
+                continue
+            rows = [(frame_num, track_id, track) for frame_num, frame_tracks in enumerate(object_tracks)
+                    for track_id, track in frame_tracks.items()]
+            positions = [track.get('position_transformed') or (np.nan, np.nan) for _, _, track in rows]
+            speed, acceleration, distance = self.compute([frame_num for frame_num, _, _ in rows],
+                                                         [track_id for _, track_id, _ in rows],
+                                                         positions, len(object_tracks))
+
+            for (_, _, track), row_speed, row_acceleration, row_distance in zip(
+                    rows, speed.tolist(), acceleration.tolist(), distance.tolist()):
+                if math.isnan(row_speed):
+                    continue
+                track['speed'] = row_speed
+                track['distance'] = row_distance
+                if not math.isnan(row_acceleration):
+                    track['acceleration'] = row_acceleration
+
+    def add_speed_and_distance_to_table(self,table):
+        players = np.flatnonzero(table.mask('players'))
+        speed, acceleration, distance = self.compute(table.frame[players], table.track_id[players],
+                                                     table.position_transformed[players], table.num_frames)
+        table.speed[players] = speed
+        table.acceleration[players] = acceleration
+        table.distance[players] = distance
+
+    def get_player_series(self,table):
+        # Per-player time series of the computed columns:
+        # {track_id: {"frames", "speed", "acceleration", "distance"}}
+        players = np.flatnonzero(table.mask('players') & ~np.isnan(table.speed))
+        players = players[np.lexsort((table.frame[players], table.track_id[players]))]
+        track_ids = table.track_id[players]
+        boundaries = np.flatnonzero(np.diff(track_ids)) + 1
+        series = {}
+        for rows in np.split(players, boundaries):
+            if len(rows) == 0:
+                continue
+            series[int(table.track_id[rows[0]])] = {
+                "frames": table.frame[rows],
+                "speed": table.speed[rows],
+                "acceleration": table.acceleration[rows],
+                "distance": table.distance[rows],
+            }
+        return series
     
     def draw_speed_and_distance(self,frames,tracks):
         output_frames = []
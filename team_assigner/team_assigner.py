@@ -1,3 +1,4 @@
+import cv2
 import numpy as np
 from sklearn.cluster import KMeans
 
@@ -5,6 +6,11 @@ class TeamAssigner:
     def __init__(self):
         self.team_colors = {}
         self.player_team_dict = {}
+
+        # Every crop is resized to the same small patch so that all players of
+        # a frame can be clustered together as one array
+        self.patch_size = (16,16)
+        self.color_iterations = 10
     
     def get_clustering_model(self,image):
         # Reshape the image to 2D array
@@ -16,63 +22,127 @@ class TeamAssigner:
 
         return kmeans
 
-    def get_player_color(self, frame, bbox):
-        image = frame[int(bbox[1]):int(bbox[3]), int(bbox[0]):int(bbox[2])]
-
-        top_half_image = image[0:int(image.shape[0] / 2), :]
-
-        if top_half_image.size == 0:
-            return np.array([0, 0, 0])  # Return a default color or handle as needed
-
-        # Get Clustering model
-        kmeans = self.get_clustering_model(top_half_image)
-
-        # Get the cluster labels for each pixel
-        labels = kmeans.labels_
-
-        # Reshape the labels to the image shape
-        clustered_image = labels.reshape(top_half_image.shape[0], top_half_image.shape[1])
-
-        # Get the player cluster
-        corner_clusters = [clustered_image[0, 0], clustered_image[0, -1], clustered_image[-1, 0],
-                           clustered_image[-1, -1]]
-        non_player_cluster = max(set(corner_clusters), key=corner_clusters.count)
+    def get_player_colors(self, frame, bboxes):
+        # Dominant jersey color for every bbox of a frame at once: a batched
+        # 2-means over the top half of each crop, in NumPy
+        player_colors = np.zeros((len(bboxes),3))
+        patches = []
+        valid = []
+        for i, bbox in enumerate(bboxes):
+            image = frame[max(int(bbox[1]),0):int(bbox[3]), max(int(bbox[0]),0):int(bbox[2])]
+            top_half_image = image[0:int(image.shape[0] / 2), :]
+            if top_half_image.size == 0:
+                continue  # Keep the default color
+            patches.append(cv2.resize(top_half_image,self.patch_size,interpolation=cv2.INTER_AREA))
+            valid.append(i)
+
+        if not patches:
+            return player_colors
+
+        pixels = np.stack(patches).astype(np.float32).reshape(len(patches),-1,3)
+        height, width = self.patch_size[1], self.patch_size[0]
+        corner_indices = np.array([0, width-1, (height-1)*width, height*width-1])
+
+        # Start one center on the background (corners) and the other on the
+        # pixel farthest from it
+        background = pixels[:,corner_indices].mean(axis=1)
+        farthest = ((pixels-background[:,None,:])**2).sum(axis=2).argmax(axis=1)
+        centers = np.stack([background, pixels[np.arange(len(pixels)),farthest]],axis=1)
+
+        for _ in range(self.color_iterations):
+            # Squared distance to center 1 minus squared distance to center 0,
+            # expanded so only one pass over the pixels is needed
+            difference = centers[:,1]-centers[:,0]
+            offset = (centers[:,1]**2).sum(axis=1)-(centers[:,0]**2).sum(axis=1)
+            labels = (2*np.einsum('npc,nc->np',pixels,difference) > offset[:,None]).astype(np.float32)
+
+            counts_1 = labels.sum(axis=1)
+            sums_1 = np.einsum('npc,np->nc',pixels,labels)
+            counts_0 = labels.shape[1]-counts_1
+            sums_0 = pixels.sum(axis=1)-sums_1
+            new_centers = np.stack([np.where(counts_0[:,None] > 0, sums_0/np.maximum(counts_0,1)[:,None], centers[:,0]),
+                                    np.where(counts_1[:,None] > 0, sums_1/np.maximum(counts_1,1)[:,None], centers[:,1])],axis=1)
+            if np.allclose(new_centers,centers):
+                break
+            centers = new_centers
+
+        # The player cluster is the one that is not the majority of the corners
+        corner_votes = labels[:,corner_indices].sum(axis=1)
+        non_player_cluster = (corner_votes > 2).astype(int)
         player_cluster = 1 - non_player_cluster
+        player_colors[valid] = centers[np.arange(len(patches)),player_cluster]
 
-        player_color = kmeans.cluster_centers_[player_cluster]
+        return player_colors
 
-        return player_color
+    def get_player_color(self, frame, bbox):
+        return self.get_player_colors(frame, [bbox])[0]
 
 
     def assign_team_color(self,frame, player_detections):
         
-        player_colors = []
-        for _, player_detection in player_detections.items():
-            bbox = player_detection["bbox"]
-            player_color =  self.get_player_color(frame,bbox)
-            player_colors.append(player_color)
+        bboxes = [player_detection["bbox"] for player_detection in player_detections.values()]
+        player_colors = self.get_player_colors(frame,bboxes)
         
-        kmeans = KMeans(n_clusters=2, init="k-means++",n_init=10)
+        # Fixed seed and clusters numbered by their color (darker kit is team
+        # 1), so running the same video again gives the same team labels and
+        # a resumed save (see FrameStreamWriter) does not swap them
+        kmeans = KMeans(n_clusters=2, init="k-means++",n_init=10,random_state=0)
         kmeans.fit(player_colors)
 
         self.kmeans = kmeans
 
-        self.team_colors[1] = kmeans.cluster_centers_[0]
-        self.team_colors[2] = kmeans.cluster_centers_[1]
+        centers = kmeans.cluster_centers_
+        order = np.lexsort((centers[:,2],centers[:,1],centers[:,0],centers.sum(axis=1)))
+        self.cluster_teams = np.empty(2,dtype=int)
+        self.cluster_teams[order] = [1,2]
 
+        self.team_colors[1] = centers[order[0]]
+        self.team_colors[2] = centers[order[1]]
 
-    def get_player_team(self,frame,player_bbox,player_id):
-        if player_id in self.player_team_dict:
-            return self.player_team_dict[player_id]
 
-        player_color = self.get_player_color(frame,player_bbox)
+    def get_player_teams(self,frame,player_bboxes,player_ids):
+        # Classifies all new players of a frame with a single predict call;
+        # players seen before keep their team
+        new_players = [(player_id, bbox) for player_id, bbox in zip(player_ids,player_bboxes)
+                       if player_id not in self.player_team_dict]
 
-        team_id = self.kmeans.predict(player_color.reshape(1,-1))[0]
-        team_id+=1
+        if new_players:
+            player_colors = self.get_player_colors(frame,[bbox for _, bbox in new_players])
+            team_ids = self.cluster_teams[self.kmeans.predict(player_colors)]
 
-        if player_id ==91:
-            team_id=1
+            for (player_id, _), team_id in zip(new_players,team_ids):
+                if player_id ==91:
+                    team_id=1
+                self.player_team_dict[player_id] = int(team_id)
 
-        self.player_team_dict[player_id] = team_id
+        return [self.player_team_dict[player_id] for player_id in player_ids]
 
-        return team_id
+    def get_player_team(self,frame,player_bbox,player_id):
+        return self.get_player_teams(frame,[player_bbox],[player_id])[0]
+
+    def add_team_to_table(self,table,frames):
+        players = np.flatnonzero(table.mask('players'))
+        if len(players) == 0:
+            return
+
+        if not hasattr(self,'kmeans'):
+            first_frame = table.frame_slice(0)
+            first_frame_players = {track_id: {"bbox": bbox}
+                                   for track_id, bbox, is_player in zip(table.track_id[first_frame],
+                                                                        table.bbox[first_frame],
+                                                                        table.mask('players')[first_frame])
+                                   if is_player}
+            self.assign_team_color(frames[0],first_frame_players)
+
+        # Classify each track once, on the first frame it appears in, batching
+        # all tracks that first appear in the same frame
+        track_ids, first_rows = np.unique(table.track_id[players],return_index=True)
+        first_rows = players[first_rows]
+        first_frames = table.frame[first_rows]
+        for frame_num in np.unique(first_frames):
+            rows = first_rows[first_frames == frame_num]
+            self.get_player_teams(frames[frame_num],table.bbox[rows],table.track_id[rows].tolist())
+
+        teams = np.array([self.player_team_dict[track_id] for track_id in track_ids.tolist()])
+        table.team[players] = teams[np.searchsorted(track_ids,table.track_id[players])]
+        table.team_colors = dict(self.team_colors)
@@ -0,0 +1,92 @@
+import os
+import re
+import sys
+import types
+import pytest
+
+# The modules are imported from the repository root, as main.py does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class FakeFuture:
+    def __init__(self, apply):
+        self.apply = apply
+
+    def add_callbacks(self, callback, errback, callback_args=(), errback_args=()):
+        self.apply()
+        callback(None, *callback_args)
+
+
+class FakeSession:
+    # In-memory Cassandra: INSERTs keyed by the full row, the progreso_video
+    # manifest as one namespace per video
+    def __init__(self):
+        self.tables = {}
+        self.progreso = {}
+
+    def prepare(self, query):
+        return " ".join(query.split())
+
+    def insert(self, query, values):
+        match = re.match(r"INSERT INTO (\w+) \(([^)]*)\)", query)
+        table, columns = match.group(1), [column.strip() for column in match.group(2).split(",")]
+        row = dict(zip(columns, values))
+        key = (row["id_video"], row["numero_cuadro"], row.get("id_jugador"))
+        self.tables.setdefault(table, {})[key] = row
+
+    def execute_async(self, statement, values):
+        def apply():
+            for query, row_values in getattr(statement, "statements", [(statement, values)]):
+                self.insert(query, row_values)
+        return FakeFuture(apply)
+
+    def execute(self, query, values=None):
+        query = " ".join(query.split())
+        if query.startswith("UPDATE progreso_video"):
+            row = self.progreso.setdefault(values[-1], types.SimpleNamespace(
+                tablas=None, ultimo_cuadro=None, cuadros=None, completo=None))
+            if "tablas = tablas + ?" in query:
+                row.tablas = (row.tablas or set()) | values[0]
+            if "completo = true" in query:
+                row.ultimo_cuadro, row.cuadros, row.completo = values[1], values[2], True
+            elif query.startswith("UPDATE progreso_video SET ultimo_cuadro"):
+                row.ultimo_cuadro = values[0]
+        elif query.startswith("SELECT tablas") and values[0] in self.progreso:
+            return [self.progreso[values[0]]]
+        return []
+
+
+class FakeManager:
+    def __init__(self, session):
+        self.fake_session = session
+        self.cluster = None
+
+    def session(self, keyspace):
+        return self.fake_session
+
+    def prepared_statements(self, keyspace):
+        return {}
+
+    def ensure_schema(self, keyspace, create):
+        create()
+
+
+class FakeBatch:
+    def __init__(self, batch_type=None):
+        self.statements = []
+
+    def add(self, statement, values):
+        self.statements.append((statement, values))
+
+
+@pytest.fixture
+def fake_cassandra(monkeypatch):
+    # FrameStreamWriter on an in-memory session; returns the session
+    import db.frame_stream_writer as frame_stream_writer
+    from db.cassandra_connection import CassandraConnection
+    session = FakeSession()
+    manager = FakeManager(session)
+    monkeypatch.setattr(frame_stream_writer, "CassandraConnection",
+                        lambda keyspace: CassandraConnection(keyspace, manager=manager))
+    monkeypatch.setattr("db.cassandra_writer.BatchStatement", FakeBatch)
+    return session
@@ -0,0 +1,52 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+# trackers imports the detection stack
+for module in ("supervision", "torch", "psutil"):
+    pytest.importorskip(module)
+from trackers import BallTrajectory, Tracker
+
+
+def ball_bboxes(num_frames, gaps):
+    rng = np.random.default_rng(0)
+    bboxes = [list(rng.random(4) * 1000) for _ in range(num_frames)]
+    for start, end in gaps:
+        for frame_num in range(start, end):
+            bboxes[frame_num] = None
+    return bboxes
+
+
+def pandas_interpolation(bboxes):
+    frame = pd.DataFrame([bbox if bbox is not None else [np.nan]*4 for bbox in bboxes])
+    return frame.interpolate().bfill().to_numpy()
+
+
+def test_long_gap_matches_offline_interpolation():
+    bboxes = ball_bboxes(20000, [(0, 50), (100, 15000), (19990, 19995)])
+    expected = pandas_interpolation(bboxes)
+
+    start_time = time.perf_counter()
+    positions = BallTrajectory(lag=len(bboxes)).run(bboxes)
+    elapsed = time.perf_counter() - start_time
+
+    assert np.allclose(np.array(positions), expected)
+    # Linear in the number of frames (the quadratic version took seconds)
+    assert elapsed < 2.0
+
+
+def test_gap_longer_than_lag_holds_last_position():
+    bboxes = ball_bboxes(300, [(10, 200)])
+    positions = BallTrajectory(lag=24).run(bboxes)
+    assert len(positions) == len(bboxes)
+    assert positions[100] == positions[9]
+    # Once the ball is detected again the rest of the gap is interpolated
+    assert np.allclose(positions[200], bboxes[200])
+
+
+def test_tracker_interpolation_is_one_pass():
+    bboxes = ball_bboxes(20000, [(0, 50), (100, 15000)])
+    ball_positions = [{1: {"bbox": bbox}} if bbox is not None else {} for bbox in bboxes]
+    interpolated = Tracker.interpolate_ball_positions(None, ball_positions)
+    assert np.allclose([position[1]["bbox"] for position in interpolated], pandas_interpolation(bboxes))
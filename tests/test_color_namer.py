@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+webcolors = pytest.importorskip("webcolors")
+from db.color_namer import ColorNamer
+
+
+def loop_name(rgb):
+    # The per-name loop rgb_to_name used before ColorNamer
+    try:
+        return webcolors.rgb_to_name(tuple(map(int, rgb)))
+    except ValueError:
+        min_diff = float('inf')
+        closest_color = None
+        for name in webcolors.names("css3"):
+            r, g, b = webcolors.name_to_rgb(name)
+            diff = sum((c1 - c2) ** 2 for c1, c2 in zip(rgb, (r, g, b)))
+            if diff < min_diff:
+                min_diff = diff
+                closest_color = name
+        return closest_color
+
+
+def test_float_colors_match_the_loop():
+    # k-means centres are floats; the names must not depend on truncating them
+    rng = np.random.default_rng(0)
+    rgbs = rng.uniform(0, 255, size=(2000, 3))
+    rgbs[:50] = ColorNamer().palette[rng.integers(0, len(ColorNamer().palette), 50)] + rng.uniform(0, 1, size=(50, 3))
+    namer = ColorNamer()
+    assert namer.names(rgbs) == [loop_name(rgb) for rgb in rgbs.tolist()]
+    # Memoized lookups give the same names
+    assert [namer.name(rgb) for rgb in rgbs[:100]] == [loop_name(rgb) for rgb in rgbs[:100].tolist()]
+
+
+def test_integer_colors_match_the_loop():
+    namer = ColorNamer()
+    rgbs = [(0, 255, 255), (255, 0, 0), (12, 200, 77), (128, 128, 128), (41, 40, 199)]
+    assert [namer.name(rgb) for rgb in rgbs] == [loop_name(rgb) for rgb in rgbs]
+
+
+def test_quantized_names_are_cached_per_bin():
+    namer = ColorNamer(step=8)
+    assert namer.name((10.2, 20.7, 30.1)) == namer.name((13.9, 16.0, 31.5))
+    assert len(namer.cache) == 1
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+# trackers imports the detection stack
+for module in ("supervision", "torch", "psutil"):
+    pytest.importorskip(module)
+from trackers import Tracker
+from trackers.detection_stride import DetectionStride
+from trackers.inference_scheduler import InferenceScheduler
+
+
+class FakeTracker(Tracker):
+    # Detections are a function of the frame content only; every 37th frame
+    # jumps so that the stride falls back to full rate now and then
+    def __init__(self, stride):
+        self.detection_stride = DetectionStride(stride)
+        self.scheduler = InferenceScheduler()
+        self.scheduler.next_batch_size = lambda frame: 20
+        self.ball_roi = None
+
+    def detect_frames(self, frames):
+        return [int(frame[0, 0]) for frame in frames]
+
+    def add_detection_to_tracks(self, tracks, frame_num, detection, frame=None):
+        rng = np.random.default_rng(detection)
+        for object_tracks in tracks.values():
+            object_tracks.append({})
+        for player_id in range(1, 5):
+            x = player_id * 100 + detection * 2 + (50 if detection % 37 == 0 else 0) + rng.normal(0, 1)
+            tracks["players"][frame_num][player_id] = {"bbox": [x, 100, x + 30, 160]}
+
+
+@pytest.mark.parametrize("stride", [1, 3, 5])
+def test_windows_match_the_whole_video(stride):
+    # The streaming pipeline tracks one window at a time; the tracks (and so
+    # the cache entry of the stride) must be the ones of the whole video
+    frames = [np.full((4, 4), frame_num) for frame_num in range(300)]
+    expected = FakeTracker(stride).track_frames_with_stride(frames)
+
+    tracker = FakeTracker(stride)
+    tracks = tracker.new_tracks()
+    for start in range(0, len(frames), 64):
+        tracker.add_frames_with_stride(tracks, start, frames[start:start + 64])
+    assert tracks == expected
@@ -0,0 +1,42 @@
+import types
+import numpy as np
+import pytest
+
+pytest.importorskip("cassandra")
+from db.frame_stream_writer import FrameStreamWriter
+
+
+def add_frames(stream, num_frames):
+    tracks = {"players": [{1: {"bbox": [0, 0, 1, 1], "position_transformed": None}}] * num_frames,
+              "ball": [{}] * num_frames}
+    possession = types.SimpleNamespace(to_columns=lambda: {
+        name: np.zeros(num_frames) for name in ["team_ball_control", "team_1", "team_2", "team_1_window", "team_2_window"]})
+    for frame_num in range(num_frames):
+        stream.add_frame(frame_num, tracks, np.zeros(num_frames), possession)
+
+
+@pytest.fixture
+def failing_session(fake_cassandra, monkeypatch):
+    def execute_async(statement, values):
+        raise RuntimeError("write failed")
+    monkeypatch.setattr(fake_cassandra, "execute_async", execute_async)
+    return fake_cassandra
+
+
+def test_write_error_is_raised_by_close(failing_session):
+    stream = FrameStreamWriter("video").start()
+    add_frames(stream, 3)
+    with pytest.raises(RuntimeError, match="write failed"):
+        stream.close(completed=True)
+    assert failing_session.progreso["video"].completo is None
+
+
+def test_write_error_does_not_replace_the_pipeline_error(failing_session):
+    # The rows are only written on close, after the pipeline failed
+    stream = FrameStreamWriter("video").start()
+    with pytest.raises(ValueError, match="draw failed"):
+        try:
+            add_frames(stream, 3)
+            raise ValueError("draw failed")
+        finally:
+            stream.close(completed=False)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+# trackers imports the detection stack
+for module in ("supervision", "torch", "psutil", "scipy"):
+    pytest.importorskip(module)
+from trackers import TrackTable
+from player_ball_assigner import PlayerBallAssigner
+
+
+def make_table(num_frames):
+    # Players scattered over a 400x300 area so the ball is sometimes within
+    # reach of several of them, sometimes of none
+    rng = np.random.default_rng(0)
+    tracks = {"players": [], "referees": [], "ball": []}
+    for frame_num in range(num_frames):
+        players = {}
+        for player_id in range(1, 23):
+            x, y = rng.uniform(0, 400), rng.uniform(0, 300)
+            players[player_id] = {"bbox": [x, y - 60, x + rng.uniform(15, 40), y], "team": 1 + player_id % 2}
+        tracks["players"].append(players)
+        tracks["referees"].append({})
+        x, y = rng.uniform(0, 400), rng.uniform(0, 300)
+        tracks["ball"].append({1: {"bbox": [x, y, x + 8, y + 8]}} if frame_num % 10 else {})
+    return TrackTable.from_tracks(tracks)
+
+
+def test_indexed_assignment_matches_the_scan():
+    scan_table = make_table(500)
+    indexed_table = make_table(500)
+    scan_control = PlayerBallAssigner().assign_ball_to_table(scan_table)
+    indexed_control = PlayerBallAssigner(indexed=True).assign_ball_to_table(indexed_table)
+
+    assert 50 < scan_table.has_ball.sum() < 450
+    np.testing.assert_array_equal(indexed_control, scan_control)
+    np.testing.assert_array_equal(indexed_table.has_ball, scan_table.has_ball)
+    np.testing.assert_array_equal(indexed_table.assigned_player, scan_table.assigned_player)
+
+
+def test_indexed_assignment_marks_every_ball():
+    table = TrackTable(1, [0, 0, 0, 0], [0, 0, 2, 2], [1, 2, 1, 2],
+                       [[0, 0, 20, 100], [500, 0, 520, 100], [10, 95, 14, 99], [505, 95, 509, 99]],
+                       columns={"team": [1, 2, 0, 0]})
+    control = PlayerBallAssigner(indexed=True).assign_ball_to_table(table)
+    assert table.has_ball.tolist() == [True, True, False, False]
+    assert table.assigned_player.tolist() == [-1, -1, 1, 2]
+    assert control.tolist() == [1]
@@ -0,0 +1,75 @@
+import types
+import numpy as np
+import pytest
+
+pytest.importorskip("cassandra")
+import db.frame_stream_writer as frame_stream_writer
+from team_assigner import TeamAssigner
+
+KITS = [(40, 40, 200), (200, 80, 30)]
+BACKGROUND = (40, 160, 40)
+
+
+def make_video(num_frames, num_players=6):
+    frame = np.full((240, 480, 3), BACKGROUND, dtype=np.uint8)
+    players = {}
+    for player_id in range(1, num_players + 1):
+        x = 20 + (player_id - 1) * 75
+        bbox = [x, 40, x + 50, 200]
+        frame[60:120, x + 10:x + 40] = KITS[player_id % 2]
+        players[player_id] = {"bbox": bbox, "position_transformed": None}
+    tracks = {
+        "players": [{player_id: dict(player) for player_id, player in players.items()} for _ in range(num_frames)],
+        "ball": [{1: {"bbox": [0, 0, 1, 1], "assigned_player": 1}} for _ in range(num_frames)],
+    }
+    return frame, tracks
+
+
+def assign_teams(frame, tracks, reverse):
+    # The second run sees the players in another order, which changes the
+    # k-means initialization of a non-deterministic labelling
+    team_assigner = TeamAssigner()
+    first_players = dict(reversed(list(tracks["players"][0].items()))) if reverse else tracks["players"][0]
+    team_assigner.assign_team_color(frame, first_players)
+    for players in tracks["players"]:
+        teams = team_assigner.get_player_teams(frame, [player["bbox"] for player in players.values()],
+                                               list(players.keys()))
+        for player, team in zip(players.values(), teams):
+            player["team"] = team
+            player["team_color"] = team_assigner.team_colors[team]
+    team_ball_control = np.array([players[1]["team"] for players in tracks["players"]])
+    return team_ball_control
+
+
+def test_resumed_video_keeps_team_labels(fake_cassandra):
+    session = fake_cassandra
+
+    num_frames = 120
+    possession = types.SimpleNamespace(to_columns=lambda: {
+        name: np.zeros(num_frames) for name in ["team_ball_control", "team_1", "team_2", "team_1_window", "team_2_window"]})
+
+    # First run stops after two checkpoints
+    frame, tracks = make_video(num_frames)
+    team_ball_control = assign_teams(frame, tracks, reverse=False)
+    stream = frame_stream_writer.FrameStreamWriter("video", checkpoint_frames=24).start()
+    for frame_num in range(60):
+        stream.add_frame(frame_num, tracks, team_ball_control, possession)
+    stream.close(completed=False)
+    assert session.progreso["video"].ultimo_cuadro == 59
+
+    # Second run starts over and resumes the save after the checkpoint
+    frame, tracks = make_video(num_frames)
+    team_ball_control = assign_teams(frame, tracks, reverse=True)
+    stream = frame_stream_writer.FrameStreamWriter("video", checkpoint_frames=24).start()
+    assert stream.resume_frame == 60
+    for frame_num in range(num_frames):
+        stream.add_frame(frame_num, tracks, team_ball_control, possession)
+    stream.close(completed=True)
+
+    jugadores = session.tables["jugadores"].values()
+    assert len(jugadores) == num_frames * 6
+    for player_id in range(1, 7):
+        assert len({row["equipo"] for row in jugadores if row["id_jugador"] == player_id}) == 1
+    assert len({row["equipo_en_control"] for row in session.tables["balon"].values()}) == 1
+    # Same kit, same team; the darker kit is team 1
+    assert {row["equipo"] for row in jugadores if row["id_jugador"] % 2 == 0} == {"1"}
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+# trackers imports the detection stack
+for module in ("supervision", "torch", "psutil"):
+    pytest.importorskip(module)
+from trackers import TrackTable
+
+
+def make_tracks(num_frames):
+    rng = np.random.default_rng(0)
+    tracks = {"players": [], "referees": [], "ball": []}
+    for frame_num in range(num_frames):
+        tracks["players"].append({player_id: {"bbox": list(rng.random(4) * 1000), "team": 1 + player_id % 2,
+                                              "team_color": (player_id % 2, 0, 0)}
+                                  for player_id in range(1, 23) if (player_id + frame_num) % 7})
+        tracks["referees"].append({30: {"bbox": list(rng.random(4) * 1000)}})
+        tracks["ball"].append({1: {"bbox": list(rng.random(4) * 1000)}} if frame_num % 3 else {})
+    return tracks
+
+
+def test_view_matches_to_tracks():
+    table = TrackTable.from_tracks(make_tracks(50))
+    table.position[:] = 1.0
+    table.position_adjusted[::2] = 2.0
+    table.speed[::3] = 4.0
+    table.distance[::3] = 5.0
+    table.has_ball[::5] = True
+
+    expected = table.to_tracks()
+    view = table.view()
+    for object_name in ["players", "referees", "ball"]:
+        assert len(view[object_name]) == 50
+        for frame_num in range(50):
+            assert view[object_name][frame_num] == expected[object_name][frame_num]
+    with pytest.raises(IndexError):
+        view["players"][50]
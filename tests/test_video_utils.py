@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+import utils.video_utils as video_utils
+
+
+class FailingEncoder:
+    def __init__(self):
+        self.frames = 0
+
+    def write(self, frame):
+        self.frames += 1
+
+    def release(self):
+        raise RuntimeError("ffmpeg exited with code 1")
+
+
+@pytest.fixture
+def failing_writer(monkeypatch):
+    monkeypatch.setattr(video_utils, "open_encoder", lambda *args: FailingEncoder())
+    writer = video_utils.VideoWriter("output.mp4", (8, 8))
+    writer.write(np.zeros((8, 8, 3), dtype=np.uint8))
+    return writer
+
+
+def test_release_raises_encoder_errors(failing_writer):
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        failing_writer.release()
+    assert failing_writer.encoders[0].frames == 1
+    # Reported once
+    failing_writer.release()
+
+
+def test_release_does_not_replace_the_pipeline_error(failing_writer):
+    with pytest.raises(ValueError, match="draw failed"):
+        try:
+            raise ValueError("draw failed")
+        finally:
+            failing_writer.release()
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+OBJECT_TYPES = ["players", "referees", "ball"]
+
+class TrackCache:
+    # On-disk cache for detection tracks and camera movement. Entries are keyed
+    # by a hash of everything that influences the result (video content, model
+    # weights and parameters) and stored as compressed NumPy column archives.
+    # Tracks and camera movement use separate keys, so changing only the camera
+    # parameters still reuses the cached YOLO tracks. When the cache grows over
+    # max_size_bytes the least recently used entries are deleted.
+    def __init__(self, cache_dir='./cache', max_size_bytes=2 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.file_hashes = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def hash_file(self, path):
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self.file_hashes:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            self.file_hashes[memo_key] = sha.hexdigest()
+        return self.file_hashes[memo_key]
+
+    def make_key(self, *parts):
+        sha = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                sha.update(str(part.shape).encode())
+                sha.update(np.ascontiguousarray(part).tobytes())
+            elif isinstance(part, dict):
+                sha.update(self.make_key(*[(k, part[k]) for k in sorted(part)]).encode())
+            elif isinstance(part, (list, tuple)):
+                sha.update(self.make_key(*part).encode())
+            else:
+                sha.update(json.dumps(part, default=repr).encode())
+            sha.update(b'|')
+        return sha.hexdigest()
+
+    def get_tracks(self, key):
+        columns = self.load(key)
+        if columns is None:
+            return None
+
+        num_frames = int(columns["num_frames"])
+        tracks = {object_type: [{} for _ in range(num_frames)] for object_type in OBJECT_TYPES}
+        for object_type in OBJECT_TYPES:
+            frames = columns[f"{object_type}_frame"]
+            track_ids = columns[f"{object_type}_track_id"]
+            bboxes = columns[f"{object_type}_bbox"].tolist()
+            for frame_num, track_id, bbox in zip(frames.tolist(), track_ids.tolist(), bboxes):
+                tracks[object_type][frame_num][track_id] = {"bbox": bbox}
+        return tracks
+
+    def put_tracks(self, key, tracks):
+        columns = {"num_frames": np.array(len(tracks["players"]))}
+        for object_type in OBJECT_TYPES:
+            rows = [(frame_num, track_id, track["bbox"])
+                    for frame_num, frame_tracks in enumerate(tracks[object_type])
+                    for track_id, track in frame_tracks.items()]
+            columns[f"{object_type}_frame"] = np.array([row[0] for row in rows], dtype=np.int32)
+            columns[f"{object_type}_track_id"] = np.array([row[1] for row in rows], dtype=np.int64)
+            columns[f"{object_type}_bbox"] = np.array([row[2] for row in rows], dtype=np.float32).reshape(-1, 4)
+        self.save(key, columns)
+
+    def get_camera_movement(self, key):
+        columns = self.load(key)
+        if columns is None:
+            return None
+        return columns["camera_movement"].tolist()
+
+    def put_camera_movement(self, key, camera_movement):
+        self.save(key, {"camera_movement": np.array(camera_movement, dtype=np.float64).reshape(-1, 2)})
+
+    def load(self, key):
+        # Batch workers share the cache: another process may evict the entry
+        # at any point, which is just a miss
+        path = self._entry_path(key)
+        try:
+            with np.load(path) as data:
+                columns = {name: data[name] for name in data.files}
+            # Touch the entry so that eviction sees it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return columns
+
+    def save(self, key, columns):
+        path = self._entry_path(key)
+        # Per-process temporary file: two workers may save the same key
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_path, **columns)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz') or name.endswith('.tmp.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue  # Evicted by another worker
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
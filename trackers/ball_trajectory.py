@@ -0,0 +1,91 @@
+from collections import deque
+import numpy as np
+
+class BallTrajectory:
+    # Online version of the ball interpolation. Ball bboxes (or None when the
+    # ball was not detected) are fed one frame at a time, and each frame is
+    # emitted at most `lag` frames later:
+    #   - a gap closed by a new detection within the lag is filled linearly,
+    #     like interpolate() on the whole video;
+    #   - frames before the first detection get that detection (bfill);
+    #   - a gap still open when its frames are due holds the last position
+    #     and the rest of the gap is interpolated from there.
+    # With lag >= the longest gap the output is the same as the offline
+    # interpolation. smoothing > 0 averages every emitted bbox with the known
+    # bboxes up to `smoothing` frames before and after it.
+    def __init__(self, lag=24, smoothing=0):
+        if smoothing > lag:
+            raise ValueError("smoothing cannot look further ahead than the lag.")
+        self.lag = lag
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        self.pending = deque()
+        # Pending frames without a value yet, in order: always the frames
+        # after last_frame, so a new detection resolves all of them
+        self.unresolved = deque()
+        self.values = {}
+        self.history = deque(maxlen=self.smoothing)
+        self.last_frame = None
+        self.last_bbox = None
+
+    def update(self, frame_num, bbox):
+        # Returns the (frame_num, bbox or None) pairs that became final
+        self.pending.append(frame_num)
+        if bbox is None:
+            self.unresolved.append(frame_num)
+        else:
+            bbox = np.asarray(bbox, dtype=float)
+            unresolved = list(self.unresolved)
+            self.unresolved.clear()
+            if unresolved:
+                if self.last_frame is None:
+                    fill = np.tile(bbox, (len(unresolved), 1))
+                else:
+                    weights = (np.array(unresolved) - self.last_frame) / (frame_num - self.last_frame)
+                    fill = self.last_bbox + weights[:,None]*(bbox - self.last_bbox)
+                self.values.update(zip(unresolved, fill))
+            self.values[frame_num] = bbox
+            self.last_frame = frame_num
+            self.last_bbox = bbox
+
+        emitted = []
+        while self.pending and self.pending[0] <= frame_num - self.lag:
+            emitted.append(self.emit())
+        return emitted
+
+    def flush(self):
+        # End of the video: everything still pending is final
+        emitted = []
+        while self.pending:
+            emitted.append(self.emit())
+        return emitted
+
+    def emit(self):
+        frame_num = self.pending.popleft()
+        if frame_num not in self.values:
+            self.unresolved.popleft()
+            if self.last_bbox is None:
+                return frame_num, None
+            # Gap longer than the lag: hold the last position and continue any
+            # later interpolation from here
+            self.values[frame_num] = self.last_bbox
+            self.last_frame = frame_num
+
+        bbox = self.values.pop(frame_num)
+        if self.smoothing:
+            window = [*self.history, bbox]
+            window += [self.values[frame] for frame in range(frame_num+1, frame_num+1+self.smoothing)
+                       if frame in self.values]
+            self.history.append(bbox)
+            bbox = np.mean(window, axis=0)
+        return frame_num, bbox.tolist()
+
+    def run(self, bboxes):
+        # Whole sequence at once; returns one bbox (or None) per frame
+        positions = []
+        for frame_num, bbox in enumerate(bboxes):
+            positions += self.update(frame_num, bbox)
+        positions += self.flush()
+        return [bbox for _, bbox in positions]
@@ -0,0 +1,107 @@
+import numpy as np
+
+def box_iou(box_a, box_b):
+    x1 = np.maximum(box_a[:,0], box_b[:,0])
+    y1 = np.maximum(box_a[:,1], box_b[:,1])
+    x2 = np.minimum(box_a[:,2], box_b[:,2])
+    y2 = np.minimum(box_a[:,3], box_b[:,3])
+    intersection = np.clip(x2-x1, 0, None) * np.clip(y2-y1, 0, None)
+    area_a = (box_a[:,2]-box_a[:,0]) * (box_a[:,3]-box_a[:,1])
+    area_b = (box_b[:,2]-box_b[:,0]) * (box_b[:,3]-box_b[:,1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+
+class DetectionStride:
+    # Runs YOLO only every `stride` frames. The frames in between get the
+    # boxes of the last detected frame moved with each track's constant
+    # velocity (measured between its last two detections). On every detected
+    # frame the prediction is compared with what was actually detected; if
+    # the boxes drifted (mean IoU under iou_threshold) or too many tracks
+    # appeared or disappeared, detection falls back to every frame for the
+    # next fallback_frames frames.
+    def __init__(self, stride=1, iou_threshold=0.5, max_unmatched=0.2, fallback_frames=24):
+        self.stride = stride
+        self.iou_threshold = iou_threshold
+        self.max_unmatched = max_unmatched
+        self.fallback_frames = fallback_frames
+        self.reset()
+
+    def reset(self):
+        self.last_detected = None
+        # The first two frames are always detected to measure velocities
+        self.full_rate_until = 2
+        self.boxes = {}
+        self.velocities = {}
+        self.detected_frames = 0
+        self.fallbacks = 0
+
+    def needs_detection(self, frame_num, last_detected=None):
+        if last_detected is None:
+            last_detected = self.last_detected
+        return (self.stride <= 1 or last_detected is None or frame_num < self.full_rate_until
+                or frame_num - last_detected >= self.stride)
+
+    def plan(self, frame_num, num_frames, count):
+        # The next `count` frames that will need detection if the current
+        # mode holds, so they can be sent to YOLO in one batch
+        frames = []
+        last_detected = self.last_detected
+        while frame_num < num_frames and len(frames) < count:
+            if self.needs_detection(frame_num, last_detected):
+                frames.append(frame_num)
+                last_detected = frame_num
+            frame_num += 1
+        return frames
+
+    def predict(self, frame_num):
+        predicted = {}
+        for object, boxes in self.boxes.items():
+            predicted[object] = {}
+            for track_id, bbox in boxes.items():
+                bbox = bbox + self.velocities[object][track_id] * (frame_num - self.last_detected)
+                predicted[object][track_id] = {"bbox": bbox.tolist()}
+        return predicted
+
+    def is_uncertain(self, predicted, frame_tracks):
+        ious = []
+        unmatched = 0
+        total = 0
+        for object, detected in frame_tracks.items():
+            expected = predicted.get(object, {})
+            matched = [track_id for track_id in detected if track_id in expected]
+            if matched:
+                ious.append(box_iou(np.array([expected[track_id]["bbox"] for track_id in matched]),
+                                    np.array([detected[track_id]["bbox"] for track_id in matched])))
+            unmatched += len(detected) + len(expected) - 2*len(matched)
+            total += len(detected) + len(expected) - len(matched)
+
+        if total == 0:
+            return False
+        if unmatched / total > self.max_unmatched:
+            return True
+        return bool(ious) and np.concatenate(ious).mean() < self.iou_threshold
+
+    def update(self, frame_num, frame_tracks):
+        # frame_tracks: {object: {track_id: {"bbox": ...}}} of a detected frame
+        self.detected_frames += 1
+        if self.last_detected is not None and self.stride > 1:
+            if self.is_uncertain(self.predict(frame_num), frame_tracks):
+                if frame_num >= self.full_rate_until:
+                    self.fallbacks += 1
+                self.full_rate_until = frame_num + self.fallback_frames
+
+        boxes = {}
+        velocities = {}
+        for object, detected in frame_tracks.items():
+            boxes[object] = {}
+            velocities[object] = {}
+            for track_id, track in detected.items():
+                bbox = np.asarray(track["bbox"], dtype=float)
+                previous = self.boxes.get(object, {}).get(track_id)
+                if previous is not None:
+                    velocities[object][track_id] = (bbox - previous) / (frame_num - self.last_detected)
+                else:
+                    velocities[object][track_id] = np.zeros(4)
+                boxes[object][track_id] = bbox
+        self.boxes = boxes
+        self.velocities = velocities
+        self.last_detected = frame_num
@@ -0,0 +1,95 @@
+import os
+from ultralytics import YOLO
+
+class DetectorBackend:
+    # A detector returns ultralytics Results for a batch of BGR frames, which
+    # add_detection_to_tracks turns into sv.Detections. Backends only differ
+    # in the runtime that executes the network.
+    name = None
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.model = YOLO(model_path)
+
+    def predict(self, frames, conf, **options):
+        return self.model.predict(frames, conf=conf, **options)
+
+    def cache_parts(self):
+        # Everything that changes the detections, for the track cache key
+        return [self.name]
+
+class PyTorchBackend(DetectorBackend):
+    name = "pytorch"
+
+    def cache_parts(self):
+        # Keeps the cache keys of the PyTorch model as they were
+        return []
+
+class ExportedBackend(DetectorBackend):
+    # Exports the PyTorch weights once (next to the .pt file, re-exported
+    # when the weights are newer) and runs the exported model on the CPU.
+    # dynamic=True keeps the batch dimension free so the inference scheduler
+    # can still pick the batch size.
+    format = None
+
+    def __init__(self, model_path, int8=False, calibration_data=None, imgsz=640):
+        self.int8 = int8
+        self.calibration_data = calibration_data
+        self.imgsz = imgsz
+        self.source_path = model_path
+        super().__init__(self.export(model_path))
+
+    def exported_path(self, model_path):
+        raise NotImplementedError
+
+    def export(self, model_path):
+        exported_path = self.exported_path(model_path)
+        if os.path.exists(exported_path) and os.path.getmtime(exported_path) >= os.path.getmtime(model_path):
+            return exported_path
+
+        options = {"format": self.format, "dynamic": True, "imgsz": self.imgsz}
+        if self.int8:
+            options["int8"] = True
+            if self.calibration_data:
+                options["data"] = self.calibration_data
+        return YOLO(model_path).export(**options)
+
+    def predict(self, frames, conf, **options):
+        return self.model.predict(frames, conf=conf, device="cpu", **options)
+
+    def cache_parts(self):
+        return [self.name, self.int8]
+
+class OnnxBackend(ExportedBackend):
+    # ONNX Runtime (CPUExecutionProvider)
+    name = "onnx"
+    format = "onnx"
+
+    def __init__(self, model_path, int8=False, calibration_data=None, imgsz=640):
+        if int8:
+            raise ValueError("INT8 quantization is only supported by the openvino backend.")
+        super().__init__(model_path, int8=int8, calibration_data=calibration_data, imgsz=imgsz)
+
+    def exported_path(self, model_path):
+        return f"{os.path.splitext(model_path)[0]}.onnx"
+
+class OpenVinoBackend(ExportedBackend):
+    # OpenVINO runtime, optionally INT8 (post-training quantization with
+    # NNCF, calibrated on calibration_data, a YOLO dataset yaml)
+    name = "openvino"
+    format = "openvino"
+
+    def exported_path(self, model_path):
+        suffix = "_int8" if self.int8 else ""
+        return f"{os.path.splitext(model_path)[0]}{suffix}_openvino_model"
+
+DETECTOR_BACKENDS = {
+    "pytorch": PyTorchBackend,
+    "onnx": OnnxBackend,
+    "openvino": OpenVinoBackend,
+}
+
+def load_detector(model_path, backend="pytorch", **options):
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend '{backend}'. Use one of: {', '.join(DETECTOR_BACKENDS)}.")
+    return DETECTOR_BACKENDS[backend](model_path, **options)
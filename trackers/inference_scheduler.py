@@ -0,0 +1,87 @@
+import time
+import psutil
+import torch
+
+class InferenceScheduler:
+    # Picks the YOLO batch size from the measured per-frame latency and the
+    # memory that is free right now. Starting from batch_size it grows the
+    # batch while frames/s keeps improving by more than min_gain, then settles
+    # on the best size seen. The size is always capped by what fits in
+    # memory_fraction of the free (GPU or system) memory, and is halved when
+    # the device runs out of memory.
+    def __init__(self, batch_size=20, min_batch_size=1, max_batch_size=64,
+                 memory_fraction=0.5, growth=1.5, min_gain=0.05):
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.memory_fraction = memory_fraction
+        self.growth = growth
+        self.min_gain = min_gain
+        self.settled = False
+        self.latencies = {}
+        self.bytes_per_frame = None
+
+    def free_memory(self):
+        if torch.cuda.is_available():
+            free, _ = torch.cuda.mem_get_info()
+            return free
+        return psutil.virtual_memory().available
+
+    def memory_limit(self, frame):
+        # Until a batch has been measured, assume every frame costs a few
+        # copies of itself (letterboxed input, float tensor and outputs)
+        bytes_per_frame = self.bytes_per_frame or frame.nbytes * 8
+        return max(self.min_batch_size, int(self.free_memory() * self.memory_fraction / bytes_per_frame))
+
+    def next_batch_size(self, frame):
+        return max(self.min_batch_size, min(self.batch_size, self.max_batch_size, self.memory_limit(frame)))
+
+    def run(self, predict, frames):
+        # Runs predict over frames in scheduled batches, timing each one
+        results = []
+        start = 0
+        while start < len(frames):
+            batch_size = self.next_batch_size(frames[start])
+            batch = frames[start:start+batch_size]
+            try:
+                if torch.cuda.is_available():
+                    torch.cuda.reset_peak_memory_stats()
+                start_time = time.perf_counter()
+                results += predict(batch)
+                self.record(len(batch), time.perf_counter() - start_time)
+            except torch.cuda.OutOfMemoryError:
+                if batch_size <= self.min_batch_size:
+                    raise
+                self.on_out_of_memory(batch_size)
+                continue
+            start += len(batch)
+        return results
+
+    def record(self, batch_size, seconds):
+        if torch.cuda.is_available():
+            self.bytes_per_frame = max(self.bytes_per_frame or 0, torch.cuda.max_memory_allocated() / batch_size)
+
+        # Only full batches say something about their size; the last batch of
+        # a video is usually smaller
+        if batch_size != self.batch_size:
+            return
+        latency = seconds / batch_size
+        self.latencies[batch_size] = min(latency, self.latencies.get(batch_size, latency))
+        if self.settled:
+            return
+
+        best_size = min(self.latencies, key=self.latencies.get)
+        if best_size == batch_size and batch_size < self.max_batch_size:
+            # Still improving: try a bigger batch
+            previous = [latency for size, latency in self.latencies.items() if size < batch_size]
+            if not previous or latency < min(previous) * (1 - self.min_gain):
+                self.batch_size = min(self.max_batch_size, int(batch_size * self.growth) + 1)
+                return
+        self.batch_size = best_size
+        self.settled = True
+
+    def on_out_of_memory(self, batch_size):
+        torch.cuda.empty_cache()
+        self.max_batch_size = max(self.min_batch_size, batch_size // 2)
+        self.batch_size = self.max_batch_size
+        self.settled = True
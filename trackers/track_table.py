@@ -0,0 +1,186 @@
+import math
+import numpy as np
+
+OBJECT_TYPES = ["players", "referees", "ball"]
+
+# Computed columns: name -> (shape of one row, dtype, value when missing)
+COLUMNS = {
+    "position": ((2,), np.float64, np.nan),
+    "position_adjusted": ((2,), np.float64, np.nan),
+    "position_transformed": ((2,), np.float64, np.nan),
+    "speed": ((), np.float64, np.nan),
+    "acceleration": ((), np.float64, np.nan),
+    "distance": ((), np.float64, np.nan),
+    "team": ((), np.int8, 0),
+    "has_ball": ((), bool, False),
+    "assigned_player": ((), np.int64, -1),
+}
+
+class TrackTable:
+    # Columnar store for all tracks of a video: one row per (frame, object
+    # type, track_id), sorted by frame so every frame is a contiguous slice.
+    # Missing float values are NaN and team 0 means "not assigned".
+    def __init__(self, num_frames, frame, object_type, track_id, bbox, columns=None):
+        columns = columns or {}
+        frame = np.asarray(frame, dtype=np.int32)
+        object_type = np.asarray(object_type, dtype=np.int8)
+        track_id = np.asarray(track_id, dtype=np.int64)
+        order = np.lexsort((track_id, object_type, frame))
+
+        self.num_frames = num_frames
+        self.frame = frame[order]
+        self.object_type = object_type[order]
+        self.track_id = track_id[order]
+        self.bbox = np.asarray(bbox, dtype=np.float64).reshape(-1, 4)[order]
+        for name, (shape, dtype, missing) in COLUMNS.items():
+            if name in columns:
+                values = np.asarray(columns[name], dtype=dtype).reshape((len(frame),) + shape)
+            else:
+                values = np.full((len(frame),) + shape, missing, dtype=dtype)
+            setattr(self, name, values[order])
+        self.team_colors = {}
+
+        self.frame_offsets = np.searchsorted(self.frame, np.arange(num_frames + 1))
+
+    def __len__(self):
+        return len(self.frame)
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        num_frames = len(tracks["players"])
+        frame, object_type, track_id, bbox, team = [], [], [], [], []
+        team_colors = {}
+        for object_index, object_name in enumerate(OBJECT_TYPES):
+            for frame_num, frame_tracks in enumerate(tracks[object_name]):
+                for object_id, track in frame_tracks.items():
+                    frame.append(frame_num)
+                    object_type.append(object_index)
+                    track_id.append(object_id)
+                    bbox.append(track["bbox"])
+                    # Keep teams that were already assigned while streaming
+                    team.append(track.get("team", 0))
+                    if "team_color" in track:
+                        team_colors[track["team"]] = track["team_color"]
+
+        table = cls(num_frames, frame, object_type, track_id, bbox, columns={"team": team})
+        table.team_colors = team_colors
+        return table
+
+    def mask(self, object_name):
+        return self.object_type == OBJECT_TYPES.index(object_name)
+
+    def frame_slice(self, frame_num):
+        return slice(self.frame_offsets[frame_num], self.frame_offsets[frame_num + 1])
+
+    def replace_object_rows(self, object_name, frame, track_id, bbox):
+        # Returns a new table where all rows of one object type are replaced
+        # (e.g. by interpolated ball positions). The new rows start with empty
+        # computed columns; the other rows keep theirs.
+        keep = ~self.mask(object_name)
+        num_new = len(frame)
+        columns = {}
+        for name, (shape, dtype, missing) in COLUMNS.items():
+            columns[name] = np.concatenate([getattr(self, name)[keep],
+                                            np.full((num_new,) + shape, missing, dtype=dtype)])
+
+        table = TrackTable(self.num_frames,
+                           np.concatenate([self.frame[keep], frame]),
+                           np.concatenate([self.object_type[keep], np.full(num_new, OBJECT_TYPES.index(object_name))]),
+                           np.concatenate([self.track_id[keep], track_id]),
+                           np.concatenate([self.bbox[keep], np.asarray(bbox, dtype=np.float64).reshape(-1, 4)]),
+                           columns=columns)
+        table.team_colors = self.team_colors
+        return table
+
+    def to_tracks(self):
+        # Compatibility view with the original nested dict shape:
+        # {"players": [{track_id: {"bbox": [...], ...}}, ...], ...}
+        tracks = {object_name: [{} for _ in range(self.num_frames)] for object_name in OBJECT_TYPES}
+        for object_name, frame_num, track_id, track in self.rows_to_tracks(slice(None)):
+            tracks[object_name][frame_num][track_id] = track
+        return tracks
+
+    def frame_tracks(self, frame_num):
+        # The same dicts for a single frame, built from its slice only:
+        # {"players": {track_id: {...}}, "referees": {...}, "ball": {...}}
+        tracks = {object_name: {} for object_name in OBJECT_TYPES}
+        for object_name, _, track_id, track in self.rows_to_tracks(self.frame_slice(frame_num)):
+            tracks[object_name][track_id] = track
+        return tracks
+
+    def view(self):
+        return TrackTableView(self)
+
+    def rows_to_tracks(self, rows):
+        frames = self.frame[rows].tolist()
+        object_types = self.object_type[rows].tolist()
+        track_ids = self.track_id[rows].tolist()
+        bboxes = self.bbox[rows].tolist()
+        positions = self.position[rows].tolist()
+        positions_adjusted = self.position_adjusted[rows].tolist()
+        positions_transformed = self.position_transformed[rows].tolist()
+        speeds = self.speed[rows].tolist()
+        accelerations = self.acceleration[rows].tolist()
+        distances = self.distance[rows].tolist()
+        teams = self.team[rows].tolist()
+        has_ball = self.has_ball[rows].tolist()
+        assigned_players = self.assigned_player[rows].tolist()
+
+        for row in range(len(frames)):
+            track = {"bbox": bboxes[row]}
+            if not math.isnan(positions[row][0]):
+                track["position"] = tuple(positions[row])
+            if not math.isnan(positions_adjusted[row][0]):
+                track["position_adjusted"] = tuple(positions_adjusted[row])
+                if math.isnan(positions_transformed[row][0]):
+                    track["position_transformed"] = None
+                else:
+                    track["position_transformed"] = positions_transformed[row]
+            if not math.isnan(speeds[row]):
+                track["speed"] = speeds[row]
+                track["distance"] = distances[row]
+                if not math.isnan(accelerations[row]):
+                    track["acceleration"] = accelerations[row]
+            if teams[row] != 0:
+                track["team"] = teams[row]
+                track["team_color"] = self.team_colors.get(teams[row])
+            if has_ball[row]:
+                track["has_ball"] = True
+            if assigned_players[row] != -1:
+                track["assigned_player"] = assigned_players[row]
+            yield OBJECT_TYPES[object_types[row]], frames[row], track_ids[row], track
+
+class TrackTableView:
+    # Read-only stand-in for to_tracks() for code that reads
+    # tracks[object_name][frame_num] (drawing, the DAO): every lookup builds
+    # the dicts of that frame only, from its slice of the table, so a whole
+    # video never exists as nested dicts. Consecutive lookups of the same
+    # frame reuse the dicts built for it.
+    def __init__(self, table):
+        self.table = table
+        self.last_frame = (None, None)
+
+    def frame(self, frame_num):
+        last_num, tracks = self.last_frame
+        if last_num != frame_num:
+            tracks = self.table.frame_tracks(frame_num)
+            self.last_frame = (frame_num, tracks)
+        return tracks
+
+    def __getitem__(self, object_name):
+        if object_name not in OBJECT_TYPES:
+            raise KeyError(object_name)
+        return ObjectFramesView(self, object_name)
+
+class ObjectFramesView:
+    def __init__(self, view, object_name):
+        self.view = view
+        self.object_name = object_name
+
+    def __len__(self):
+        return self.view.table.num_frames
+
+    def __getitem__(self, frame_num):
+        if not 0 <= frame_num < len(self):
+            raise IndexError(frame_num)
+        return self.view.frame(frame_num)[self.object_name]
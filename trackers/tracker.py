@@ -1,18 +1,45 @@
-from ultralytics import YOLO
 import supervision as sv
 import pickle
 import os
 import numpy as np
-import pandas as pd
 import cv2
 import sys 
 sys.path.append('../')
-from utils import get_center_of_bbox, get_bbox_width, get_foot_position
+from utils import get_center_of_bbox, get_bbox_width, get_foot_position, HudRenderer
+from player_ball_assigner import PossessionStats
+from trackers.inference_scheduler import InferenceScheduler
+from trackers.detection_stride import DetectionStride
+from trackers.detector_backends import load_detector
+from trackers.ball_roi import BallRoi
 
 class Tracker:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path) 
+    def __init__(self, model_path, detect_stride=1, ball_roi=False, backend="pytorch", **backend_options):
+        self.model_path = model_path
+        self.detector = load_detector(model_path, backend, **backend_options)
+        self.model = self.detector.model
         self.tracker = sv.ByteTrack()
+        self.conf = 0.1
+        self.hud = HudRenderer()
+        self.scheduler = InferenceScheduler()
+        self.detection_stride = DetectionStride(detect_stride)
+        self.ball_roi = BallRoi() if ball_roi else None
+
+    def reset(self):
+        # Fresh ByteTrack state so a Tracker (and its loaded model) can be
+        # reused for the next video without carrying over track ids
+        self.tracker = sv.ByteTrack()
+        self.detection_stride.reset()
+        if self.ball_roi is not None:
+            self.ball_roi.reset()
+
+    def get_cache_key(self, cache, video_path):
+        parts = ["tracks", cache.hash_file(video_path), cache.hash_file(self.model_path), self.conf,
+                 *self.detector.cache_parts()]
+        if self.detection_stride.stride > 1:
+            parts.append(self.detection_stride.stride)
+        if self.ball_roi is not None:
+            parts.append("ball_roi")
+        return cache.make_key(*parts)
 
     def add_position_to_tracks(sekf,tracks):
         for object, object_tracks in tracks.items():
@@ -25,83 +52,183 @@ class Tracker:
                         position = get_foot_position(bbox)
                     tracks[object][frame_num][track_id]['position'] = position
 
-    def interpolate_ball_positions(self,ball_positions):
-        ball_positions = [x.get(1,{}).get('bbox',[]) for x in ball_positions]
-        df_ball_positions = pd.DataFrame(ball_positions,columns=['x1','y1','x2','y2'])
+    def add_position_to_table(self, table):
+        bbox = table.bbox
+        x_center = np.trunc((bbox[:,0]+bbox[:,2])/2)
+        # Ball position is the bbox center, everything else uses the feet
+        y = np.where(table.mask('ball'), np.trunc((bbox[:,1]+bbox[:,3])/2), np.trunc(bbox[:,3]))
+        table.position = np.column_stack([x_center, y])
+
+    def interpolate_ball_positions_table(self, table):
+        ball_mask = table.mask('ball')
+        if not ball_mask.any():
+            return table
+
+        ball_frames = table.frame[ball_mask]
+        ball_bboxes = table.bbox[ball_mask]
 
-        # Interpolate missing values
-        df_ball_positions = df_ball_positions.interpolate()
-        df_ball_positions = df_ball_positions.bfill()
+        # np.interp holds the first/last value outside the detected range, which
+        # matches interpolate() followed by bfill() on the DataFrame version
+        all_frames = np.arange(table.num_frames)
+        interpolated = np.column_stack([np.interp(all_frames, ball_frames, ball_bboxes[:,i]) for i in range(4)])
+
+        return table.replace_object_rows('ball', all_frames, np.ones(table.num_frames, dtype=np.int64), interpolated)
+
+    def interpolate_ball_positions(self,ball_positions):
+        ball_positions = [x.get(1,{}).get('bbox') for x in ball_positions]
+        known_frames = [frame_num for frame_num, bbox in enumerate(ball_positions) if bbox is not None]
+        if not known_frames:
+            return [{} for _ in ball_positions]
 
-        ball_positions = [{1: {"bbox":x}} for x in df_ball_positions.to_numpy().tolist()]
+        # One np.interp pass over the known frames, same as interpolate()
+        # followed by bfill() (see interpolate_ball_positions_table)
+        known_bboxes = np.array([ball_positions[frame_num] for frame_num in known_frames], dtype=float)
+        all_frames = np.arange(len(ball_positions))
+        interpolated = np.column_stack([np.interp(all_frames, known_frames, known_bboxes[:,i]) for i in range(4)])
 
-        return ball_positions
+        return [{1: {"bbox":bbox}} for bbox in interpolated.tolist()]
 
     def detect_frames(self, frames):
-        batch_size=20 
-        detections = [] 
-        for i in range(0,len(frames),batch_size):
-            detections_batch = self.model.predict(frames[i:i+batch_size],conf=0.1)
-            detections += detections_batch
-        return detections
-
-    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
+        # Batch size is tuned by the scheduler from latency and free memory
+        return self.scheduler.run(self.detect_batch, frames)
+
+    def detect_batch(self, frames):
+        return self.detector.predict(frames, self.conf)
+
+    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None, cache=None, cache_key=None):
         
         if read_from_stub and stub_path is not None and os.path.exists(stub_path):
             with open(stub_path,'rb') as f:
                 tracks = pickle.load(f)
             return tracks
 
-        detections = self.detect_frames(frames)
+        if cache is not None and cache_key is not None:
+            tracks = cache.get_tracks(cache_key)
+            if tracks is not None:
+                return tracks
+
+        if self.detection_stride.stride > 1:
+            tracks = self.track_frames_with_stride(frames)
+        else:
+            detections = self.detect_frames(frames)
+
+            tracks = self.new_tracks()
+
+            for frame_num, detection in enumerate(detections):
+                self.add_detection_to_tracks(tracks, frame_num, detection, frames[frame_num])
+
+        if stub_path is not None:
+            with open(stub_path,'wb') as f:
+                pickle.dump(tracks,f)
+
+        if self.ball_roi is not None:
+            print(f"Ball ROI: {self.ball_roi.found}/{self.ball_roi.searches} searches found the ball")
+
+        if cache is not None and cache_key is not None:
+            cache.put_tracks(cache_key, tracks)
+
+        return tracks
+
+    def track_frames_with_stride(self, frames):
+        # Detects only the frames DetectionStride asks for, batching the
+        # upcoming ones, and fills the rest with motion-predicted boxes
+        stride = self.detection_stride
+        stride.reset()
+        tracks = self.new_tracks()
+        self.add_frames_with_stride(tracks, 0, frames)
+        self.report_stride(len(frames))
+        return tracks
+
+    def add_frames_with_stride(self, tracks, first_frame, frames):
+        # Tracks the consecutive frames first_frame, first_frame+1, ... with
+        # the detection stride, continuing from the stride state of the
+        # previous call (the streaming pipeline passes one window at a time).
+        # Detections are only planned within these frames.
+        stride = self.detection_stride
+        end = first_frame + len(frames)
+        detections = {}
+
+        for frame_num in range(first_frame, end):
+            frame = frames[frame_num - first_frame]
+            if not stride.needs_detection(frame_num):
+                predicted = stride.predict(frame_num)
+                for object in tracks:
+                    tracks[object].append(predicted.get(object, {}))
+                continue
+
+            if frame_num not in detections:
+                # Planned frames the mode changes made unnecessary are dropped
+                detections = {planned: detection for planned, detection in detections.items() if planned > frame_num}
+                plan = stride.plan(frame_num, end, self.scheduler.next_batch_size(frame))
+                detections.update(zip(plan, self.detect_frames([frames[planned - first_frame] for planned in plan])))
 
-        tracks={
+            self.add_detection_to_tracks(tracks, frame_num, detections.pop(frame_num), frame)
+            stride.update(frame_num, {object: object_tracks[frame_num] for object, object_tracks in tracks.items()})
+
+    def report_stride(self, num_frames):
+        stride = self.detection_stride
+        print(f"Detection stride {stride.stride}: YOLO ran on {stride.detected_frames}/{num_frames} frames, "
+              f"{stride.fallbacks} fallbacks to full rate")
+
+    def detection_window(self):
+        # Frames the streaming pipeline hands to detection at once: enough for
+        # the largest batch the scheduler may pick, since it only measures
+        # (and grows past) batches that were sent whole
+        return self.scheduler.max_batch_size
+
+    def new_tracks(self):
+        return {
             "players":[],
             "referees":[],
             "ball":[]
         }
 
-        for frame_num, detection in enumerate(detections):
-            cls_names = detection.names
-            cls_names_inv = {v:k for k,v in cls_names.items()}
+    def add_detection_to_tracks(self, tracks, frame_num, detection, frame=None):
+        cls_names = detection.names
+        cls_names_inv = {v:k for k,v in cls_names.items()}
 
-            # Covert to supervision Detection format
-            detection_supervision = sv.Detections.from_ultralytics(detection)
+        # Covert to supervision Detection format
+        detection_supervision = sv.Detections.from_ultralytics(detection)
 
-            # Convert GoalKeeper to player object
-            for object_ind , class_id in enumerate(detection_supervision.class_id):
-                if cls_names[class_id] == "goalkeeper":
-                    detection_supervision.class_id[object_ind] = cls_names_inv["player"]
+        # Convert GoalKeeper to player object
+        for object_ind , class_id in enumerate(detection_supervision.class_id):
+            if cls_names[class_id] == "goalkeeper":
+                detection_supervision.class_id[object_ind] = cls_names_inv["player"]
 
-            # Track Objects
-            detection_with_tracks = self.tracker.update_with_detections(detection_supervision)
+        # Track Objects
+        detection_with_tracks = self.tracker.update_with_detections(detection_supervision)
 
-            tracks["players"].append({})
-            tracks["referees"].append({})
-            tracks["ball"].append({})
+        tracks["players"].append({})
+        tracks["referees"].append({})
+        tracks["ball"].append({})
 
-            for frame_detection in detection_with_tracks:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                track_id = frame_detection[4]
+        for frame_detection in detection_with_tracks:
+            bbox = frame_detection[0].tolist()
+            cls_id = frame_detection[3]
+            track_id = frame_detection[4]
 
-                if cls_id == cls_names_inv['player']:
-                    tracks["players"][frame_num][track_id] = {"bbox":bbox}
-                
-                if cls_id == cls_names_inv['referee']:
-                    tracks["referees"][frame_num][track_id] = {"bbox":bbox}
+            if cls_id == cls_names_inv['player']:
+                tracks["players"][frame_num][track_id] = {"bbox":bbox}
             
-            for frame_detection in detection_supervision:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-
-                if cls_id == cls_names_inv['ball']:
+            if cls_id == cls_names_inv['referee']:
+                tracks["referees"][frame_num][track_id] = {"bbox":bbox}
+        
+        for frame_detection in detection_supervision:
+            bbox = frame_detection[0].tolist()
+            cls_id = frame_detection[3]
+
+            if cls_id == cls_names_inv['ball']:
+                tracks["ball"][frame_num][1] = {"bbox":bbox}
+
+        if self.ball_roi is not None:
+            # Missed by the full-frame pass: look again in a high-resolution
+            # tile around where the ball should be
+            if 1 not in tracks["ball"][frame_num] and frame is not None:
+                bbox = self.ball_roi.search(frame, frame_num, self.detector, cls_names_inv['ball'])
+                if bbox is not None:
                     tracks["ball"][frame_num][1] = {"bbox":bbox}
-
-        if stub_path is not None:
-            with open(stub_path,'wb') as f:
-                pickle.dump(tracks,f)
-
-        return tracks
+            if 1 in tracks["ball"][frame_num]:
+                self.ball_roi.observe(frame_num, tracks["ball"][frame_num][1]["bbox"])
     
     def draw_ellipse(self,frame,bbox,color,track_id=None):
         y2 = int(bbox[3])
@@ -164,34 +291,66 @@ class Tracker:
 
         return frame
 
-    def draw_team_ball_control(self,frame,frame_num,team_ball_control):
-        # Draw a semi-transparent rectaggle 
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (1350, 850), (1900,970), (255,255,255), -1 )
+    def draw_team_ball_control(self,frame,frame_num,possession):
+        # Draw a semi-transparent rectaggle, blending only the panel region
         alpha = 0.4
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+        self.hud.blend_rectangle(frame, (1350, 850), (1900,970), (255,255,255), alpha)
 
-        team_ball_control_till_frame = team_ball_control[:frame_num+1]
-        # Get the number of time each team had ball control
-        team_1_num_frames = team_ball_control_till_frame[team_ball_control_till_frame==1].shape[0]
-        team_2_num_frames = team_ball_control_till_frame[team_ball_control_till_frame==2].shape[0]
-        team_1 = team_1_num_frames/(team_1_num_frames+team_2_num_frames)
-        team_2 = team_2_num_frames/(team_1_num_frames+team_2_num_frames)
+        # Possession is precomputed with prefix sums, so this is a lookup
+        if not isinstance(possession, PossessionStats):
+            possession = PossessionStats(possession)
+        team_1, team_2 = possession.get_possession(frame_num)
 
-        cv2.putText(frame, f"Team 1 Ball Control: {team_1*100:.2f}%",(1400,900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
-        cv2.putText(frame, f"Team 2 Ball Control: {team_2*100:.2f}%",(1400,950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+        self.hud.put_text(frame, f"Team 1 Ball Control: {team_1*100:.2f}%",(1400,900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+        self.hud.put_text(frame, f"Team 2 Ball Control: {team_2*100:.2f}%",(1400,950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
 
         return frame
 
-    def draw_annotations(self, video_frames, tracks, team_ball_control):
+    def draw_frame_annotations(self, frame, frame_num, tracks, possession):
+        # Draws in place on the given frame; callers that need to keep the
+        # original frame must pass a copy
+        player_dict = tracks["players"][frame_num]
+        ball_dict = tracks["ball"][frame_num]
+        referee_dict = tracks["referees"][frame_num]
+
+        # Dibujar jugadores
+        for track_id, player in player_dict.items():
+            color = player.get("team_color", (0, 0, 255))
+            frame = self.draw_ellipse(frame, player["bbox"], color, track_id)
+
+            if player.get('has_ball', False):
+                frame = self.draw_traingle(frame, player["bbox"], (0, 0, 255))
+
+        # Dibujar árbitros
+        for _, referee in referee_dict.items():
+            frame = self.draw_ellipse(frame, referee["bbox"], (0, 255, 255))
+
+        # Dibujar balón
+        for track_id, ball in ball_dict.items():
+            frame = self.draw_traingle(frame, ball["bbox"], (0, 255, 0))
+
+        # Dibujar control del balón
+        frame = self.draw_team_ball_control(frame, frame_num, possession)
+
+        return frame
+
+    def draw_annotations(self, video_frames, tracks, team_ball_control, in_place=False):
         # Asegurarse de que los datos de tracks coincidan con la longitud de video_frames
         for object_type in ["players", "referees", "ball"]:
             while len(tracks[object_type]) < len(video_frames):
                 tracks[object_type].append({})  # Rellenar frames faltantes con diccionarios vacíos
 
+        # Calcular la posesión una sola vez para todo el video
+        possession = team_ball_control
+        if not isinstance(possession, PossessionStats):
+            possession = PossessionStats(team_ball_control)
+
         output_video_frames = []
         for frame_num, frame in enumerate(video_frames):
-            frame = frame.copy()
+            # Con in_place se dibuja directamente sobre el frame de entrada y se
+            # evita una copia completa por frame
+            if not in_place:
+                frame = frame.copy()
 
             # Validar si el índice existe en las listas de tracks
             if frame_num >= len(tracks["players"]) or frame_num >= len(tracks["ball"]) or frame_num >= len(
@@ -199,29 +358,8 @@ class Tracker:
                 print(f"Advertencia: frame_num {frame_num} fuera del rango en tracks")
                 continue
 
-            player_dict = tracks["players"][frame_num]
-            ball_dict = tracks["ball"][frame_num]
-            referee_dict = tracks["referees"][frame_num]
-
-            # Dibujar jugadores
-            for track_id, player in player_dict.items():
-                color = player.get("team_color", (0, 0, 255))
-                frame = self.draw_ellipse(frame, player["bbox"], color, track_id)
-
-                if player.get('has_ball', False):
-                    frame = self.draw_traingle(frame, player["bbox"], (0, 0, 255))
-
-            # Dibujar árbitros
-            for _, referee in referee_dict.items():
-                frame = self.draw_ellipse(frame, referee["bbox"], (0, 255, 255))
-
-            # Dibujar balón
-            for track_id, ball in ball_dict.items():
-                frame = self.draw_traingle(frame, ball["bbox"], (0, 255, 0))
-
-            # Dibujar control del balón
-            frame = self.draw_team_ball_control(frame, frame_num, team_ball_control)
+            frame = self.draw_frame_annotations(frame, frame_num, tracks, possession)
 
             output_video_frames.append(frame)
 
-        return output_video_frames
\ No newline at end of file
+        return output_video_frames
@@ -1,2 +1,3 @@
-from .video_utils import read_video, save_video
-from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance,measure_xy_distance,get_foot_position
\ No newline at end of file
+from .video_utils import read_video, read_video_frames, get_video_properties, open_video_writer, save_video, VideoReader, VideoWriter
+from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance,measure_xy_distance,get_foot_position
+from .hud_renderer import HudRenderer
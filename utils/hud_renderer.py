@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+
+class HudRenderer:
+    # Draws the semi-transparent HUD panels and their text directly on the
+    # frame. Panels are blended only inside their own region instead of over a
+    # full-frame copy, and the blend source and text glyphs are rendered once
+    # and reused for every frame.
+    def __init__(self):
+        self.panels = {}
+        self.glyphs = {}
+
+    def blend_rectangle(self, frame, top_left, bottom_right, color, alpha):
+        # Same result as drawing a filled cv2.rectangle on a copy of the frame
+        # and blending the whole copy back with cv2.addWeighted
+        x1, y1 = max(top_left[0], 0), max(top_left[1], 0)
+        x2, y2 = min(bottom_right[0]+1, frame.shape[1]), min(bottom_right[1]+1, frame.shape[0])
+        if x2 <= x1 or y2 <= y1:
+            return frame
+
+        roi = frame[y1:y2, x1:x2]
+        key = (roi.shape, roi.dtype.str, tuple(color))
+        if key not in self.panels:
+            self.panels[key] = np.empty(roi.shape, dtype=roi.dtype)
+            self.panels[key][:] = color
+        cv2.addWeighted(self.panels[key], alpha, roi, 1-alpha, 0, dst=roi)
+        return frame
+
+    def get_glyph(self, char, font, font_scale, thickness):
+        key = (char, font, font_scale, thickness)
+        if key not in self.glyphs:
+            (width, height), baseline = cv2.getTextSize(char, font, font_scale, thickness)
+            advance = (cv2.getTextSize(char*11, font, font_scale, thickness)[0][0] - width)//10
+
+            # Render once on a padded mask and keep the offsets of the glyph
+            # pixels relative to the text origin
+            pad = height + 2*thickness
+            mask = np.zeros((height+baseline+2*pad, width+2*pad), dtype=np.uint8)
+            cv2.putText(mask, char, (pad, pad+height), font, font_scale, 255, thickness, cv2.LINE_8)
+            ys, xs = np.nonzero(mask)
+            self.glyphs[key] = (ys-(pad+height), xs-pad, advance)
+        return self.glyphs[key]
+
+    def put_text(self, frame, text, origin, font, font_scale, color, thickness):
+        # Pixel-identical to cv2.putText with LINE_8 (the default line type in
+        # OpenCV 4.x), built from the cached glyphs. Glyphs only line up exactly
+        # on whole-pixel advances, so fractional font scales use cv2.putText.
+        if font_scale != int(font_scale):
+            return cv2.putText(frame, text, origin, font, font_scale, color, thickness)
+
+        x, y = origin
+        for char in text:
+            glyph_ys, glyph_xs, advance = self.get_glyph(char, font, font_scale, thickness)
+            ys = glyph_ys + y
+            xs = glyph_xs + x
+            inside = (ys >= 0) & (ys < frame.shape[0]) & (xs >= 0) & (xs < frame.shape[1])
+            frame[ys[inside], xs[inside]] = color
+            x += advance
+        return frame
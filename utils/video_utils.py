@@ -1,24 +1,207 @@
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
 import cv2
 
-def read_video(video_path):
+class VideoReader:
+    # Decodes a video on a background thread that stays up to `prefetch`
+    # frames ahead of the consumer, so decoding overlaps with whatever is done
+    # with each frame. Iterating yields the frames in order; stopping early
+    # (or close()) stops the thread and releases the capture.
+    def __init__(self, video_path, prefetch=16):
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise FileNotFoundError(f"Unable to open video file: {video_path}")
+        self.frames = queue.Queue(max(prefetch, 1))
+        self.stopped = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self.put(frame)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.cap.release()
+            self.put(None)
+
+    def put(self, item):
+        # Gives up when the consumer has stopped reading
+        while not self.stopped.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                yield frame
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.close()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+class VideoWriter:
+    # Encodes frames on a background thread: write() only queues the frame
+    # (blocking when `buffer` frames are waiting), so drawing the next frame
+    # overlaps with encoding the previous one. codec:
+    #   'h264': libx264 through an ffmpeg pipe (needs ffmpeg on the PATH)
+    #   'mp4v', 'XVID', ...: any OpenCV fourcc
+    #   'auto': h264 when ffmpeg is available, otherwise mp4v (XVID for .avi)
+    # With preview_scale, a downscaled copy is also written to preview_path.
+    # Errors of the encode thread are raised by the next write() or release().
+    # release() is meant for finally blocks: while another exception is
+    # propagating, its errors are only reported so that they do not replace it.
+    def __init__(self, output_video_path, frame_size, fps=24, codec='auto', buffer=16,
+                 preview_path=None, preview_scale=0.25):
+        self.encoders = [open_encoder(output_video_path, frame_size, fps, codec)]
+        self.preview_size = None
+        if preview_path is not None:
+            self.preview_size = (max(int(frame_size[0]*preview_scale), 2)//2*2,
+                                 max(int(frame_size[1]*preview_scale), 2)//2*2)
+            self.encoders.append(open_encoder(preview_path, self.preview_size, fps, codec))
+        self.frames = queue.Queue(max(buffer, 1))
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                # Keep draining so write() never blocks on a failed encoder
+                continue
+            try:
+                self.encoders[0].write(frame)
+                if self.preview_size is not None:
+                    self.encoders[1].write(cv2.resize(frame, self.preview_size, interpolation=cv2.INTER_AREA))
+            except Exception as e:
+                self.error = e
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.frames.put(frame)
+
+    def release(self):
+        if self.thread is not None:
+            self.frames.put(None)
+            self.thread.join()
+            self.thread = None
+            for encoder in self.encoders:
+                try:
+                    encoder.release()
+                except Exception as e:
+                    if self.error is None:
+                        self.error = e
+        # Reported once: releasing again is a no-op
+        error, self.error = self.error, None
+        if error is not None:
+            in_flight = sys.exc_info()[1]
+            if in_flight is not None:
+                if in_flight is not error:
+                    print(f"Error writing the video: {error!r}")
+                return
+            raise error
+
+class FfmpegEncoder:
+    # H.264 encoder fed with raw BGR frames through the stdin of an ffmpeg
+    # process
+    def __init__(self, output_video_path, frame_size, fps):
+        self.process = subprocess.Popen(
+            ["ffmpeg", "-loglevel", "error", "-y",
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{frame_size[0]}x{frame_size[1]}", "-r", str(fps),
+             "-i", "-", "-an", "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+             output_video_path],
+            stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame.tobytes())
+
+    def release(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self.process.returncode}")
+
+def open_encoder(output_video_path, frame_size, fps, codec):
+    if codec == 'auto':
+        if shutil.which("ffmpeg"):
+            codec = 'h264'
+        else:
+            codec = 'XVID' if output_video_path.lower().endswith('.avi') else 'mp4v'
+    if codec == 'h264':
+        if not shutil.which("ffmpeg"):
+            raise RuntimeError("The h264 codec needs ffmpeg on the PATH.")
+        return FfmpegEncoder(output_video_path, frame_size, fps)
+
+    writer = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*codec), fps, frame_size)
+    if not writer.isOpened():
+        raise RuntimeError(f"Unable to open video writer for {output_video_path} with codec {codec}")
+    return writer
+
+def preview_path_for(output_video_path):
+    # output.mp4 -> output_preview.mp4 (also for the output.partial.mp4 of
+    # the batch runner, whose preview is written in place)
+    root, extension = os.path.splitext(output_video_path)
+    if root.endswith(".partial"):
+        root = root[:-len(".partial")]
+    return f"{root}_preview{extension}"
+
+def read_video(video_path, prefetch=16):
+    frames = list(VideoReader(video_path, prefetch))
+    if not frames:
+        raise ValueError("No frames were read from the video. Please check the video file.")
+    return frames
+
+def read_video_frames(video_path, prefetch=16):
+    # Generator version of read_video: yields one decoded frame at a time so
+    # only the frames currently being processed (and up to `prefetch` decoded
+    # ahead of them) are kept in memory
+    return iter(VideoReader(video_path, prefetch))
+
+def get_video_properties(video_path):
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise FileNotFoundError(f"Unable to open video file: {video_path}")
 
-    frames = []
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
+    properties = {
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+    }
     cap.release()
-    if not frames:
-        raise ValueError("No frames were read from the video. Please check the video file.")
-    return frames
+    return properties
+
+def open_video_writer(output_video_path, frame_size, fps=24, codec='auto', preview_scale=None, buffer=16):
+    # preview_scale: also write a downscaled preview next to the output
+    preview_path = preview_path_for(output_video_path) if preview_scale else None
+    return VideoWriter(output_video_path, frame_size, fps=fps, codec=codec, buffer=buffer,
+                       preview_path=preview_path, preview_scale=preview_scale or 0.25)
 
-def save_video(ouput_video_frames,output_video_path):
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (ouput_video_frames[0].shape[1], ouput_video_frames[0].shape[0]))
+def save_video(ouput_video_frames,output_video_path,fps=24,**options):
+    out = open_video_writer(output_video_path, (ouput_video_frames[0].shape[1], ouput_video_frames[0].shape[0]),
+                            fps=fps, **options)
     for frame in ouput_video_frames:
         out.write(frame)
     out.release()
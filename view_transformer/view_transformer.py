@@ -33,13 +33,42 @@ class ViewTransformer():
         tranform_point = cv2.perspectiveTransform(reshaped_point,self.persepctive_trasnformer)
         return tranform_point.reshape(-1,2)
 
+    def transform_points(self,points):
+        # Batch version of transform_point for an Nx2 array of positions.
+        # Returns the transformed Nx2 coordinates and a mask of the points that
+        # fall inside the pitch; rows outside the pitch (or NaN) are left NaN.
+        points = np.asarray(points,dtype=np.float64).reshape(-1,2)
+        transformed = np.full(points.shape,np.nan)
+
+        # Same integer point as pointPolygonTest gets in transform_point. The
+        # pitch quadrilateral is convex, so a point is inside (or on an edge)
+        # when it lies on the same side of every edge.
+        test_points = np.trunc(points)
+        vertices = self.pixel_vertices.astype(np.float64)
+        edges = np.roll(vertices,-1,axis=0) - vertices
+        offsets = test_points[:,None,:] - vertices[None,:,:]
+        cross = edges[None,:,0]*offsets[:,:,1] - edges[None,:,1]*offsets[:,:,0]
+        is_inside = (cross >= 0).all(axis=1) | (cross <= 0).all(axis=1)
+        is_inside &= ~np.isnan(points).any(axis=1)
+
+        # Homography as one matrix multiply in homogeneous coordinates, with
+        # the same float32 rounding as cv2.perspectiveTransform
+        inside_points = points[is_inside].astype(np.float32).astype(np.float64)
+        homogeneous = np.column_stack([inside_points,np.ones(len(inside_points))]) @ self.persepctive_trasnformer.T
+        transformed[is_inside] = (homogeneous[:,:2]/homogeneous[:,2:]).astype(np.float32)
+
+        return transformed, is_inside
+
     def add_transformed_position_to_tracks(self,tracks):
-        for object, object_tracks in tracks.items():
-            for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    position = track_info['position_adjusted']
-                    position = np.array(position)
-                    position_trasnformed = self.transform_point(position)
-                    if position_trasnformed is not None:
-                        position_trasnformed = position_trasnformed.squeeze().tolist()
-                    tracks[object][frame_num][track_id]['position_transformed'] = position_trasnformed
\ No newline at end of file
+        rows = [(object, frame_num, track_id)
+                for object, object_tracks in tracks.items()
+                for frame_num, track in enumerate(object_tracks)
+                for track_id in track]
+        positions = [tracks[object][frame_num][track_id]['position_adjusted'] for object, frame_num, track_id in rows]
+        transformed, is_inside = self.transform_points(positions)
+
+        for (object, frame_num, track_id), position_trasnformed, inside in zip(rows, transformed.tolist(), is_inside.tolist()):
+            tracks[object][frame_num][track_id]['position_transformed'] = position_trasnformed if inside else None
+
+    def add_transformed_position_to_table(self,table):
+        table.position_transformed, _ = self.transform_points(table.position_adjusted)